@@ -0,0 +1,24 @@
+# Gunicorn configuration for the dashboard
+# Usage: gunicorn -c gunicorn.conf.py src.app:app
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5001')}"
+
+# Threaded workers: requests mostly wait on SQLite, Telegram or Claude.
+# Each thread keeps its own SQLite connection (src.db.get_conn).
+worker_class = 'gthread'
+workers = int(os.getenv('GUNICORN_WORKERS', max(2, multiprocessing.cpu_count() // 2)))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+
+# The DCA proxy and AI endpoints can take a while
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+
+# No preload: importing src.app initializes the DB and starts the scheduler,
+# which must happen inside each worker, not in the arbiter before fork.
+preload_app = False
+
+accesslog = '-'
+errorlog = '-'
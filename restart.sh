@@ -138,7 +138,7 @@ fi
 
 # 4. Lancer Dashboard
 echo "🚀 Démarrage Dashboard (port 5001)..."
-nohup python3 -m src.app > app.log 2>&1 &
+nohup python3 -m gunicorn -c gunicorn.conf.py src.app:app > app.log 2>&1 &
 APP_PID=$!
 echo "  PID: $APP_PID"
 
@@ -17,6 +17,7 @@ from datetime import datetime, timedelta
 from email.utils import parsedate_to_datetime
 from dotenv import load_dotenv
 import anthropic
+import orjson
 import requests
 
 # Gmail API imports
@@ -26,6 +27,8 @@ from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+from src.services.ai_client import strip_json_fences
+
 load_dotenv()
 
 # Configuration
@@ -241,11 +244,9 @@ def summarize_emails_with_claude(emails: list) -> dict:
             messages=[{"role": "user", "content": prompt}],
         )
 
-        text = response.content[0].text.strip()
-        if text.startswith('```'):
-            text = text.replace('```json', '').replace('```', '').strip()
+        text = strip_json_fences(response.content[0].text)
 
-        return json.loads(text)
+        return orjson.loads(text)
     except Exception:
         return {}
 
@@ -348,11 +349,9 @@ def parse_calendar_request(message: str) -> dict:
             messages=[{"role": "user", "content": prompt}],
         )
 
-        text = response.content[0].text.strip()
-        if text.startswith('```'):
-            text = text.replace('```json', '').replace('```', '').strip()
+        text = strip_json_fences(response.content[0].text)
 
-        return json.loads(text)
+        return orjson.loads(text)
     except Exception as e:
         return {"error": str(e)}
 
@@ -372,11 +371,9 @@ def finalize_calendar_request(original: dict, user_response: str) -> dict:
             messages=[{"role": "user", "content": prompt}],
         )
 
-        text = response.content[0].text.strip()
-        if text.startswith('```'):
-            text = text.replace('```json', '').replace('```', '').strip()
+        text = strip_json_fences(response.content[0].text)
 
-        return json.loads(text)
+        return orjson.loads(text)
     except Exception as e:
         return {"error": str(e)}
 
@@ -641,10 +638,8 @@ Réponds en JSON:
             system="Tu optimises l'ordre des tâches pour la productivité. JSON uniquement.",
             messages=[{"role": "user", "content": prompt}]
         )
-        text = response.content[0].text.strip()
-        if text.startswith('```'):
-            text = text.replace('```json', '').replace('```', '').strip()
-        result = json.loads(text)
+        text = strip_json_fences(response.content[0].text)
+        result = orjson.loads(text)
     except Exception:
         # Fallback: return tasks sorted by priority
         priority_order = {'urgent': 0, 'important': 1, 'normal': 2}
@@ -710,10 +705,8 @@ def suggest_deadline(category: str, title: str) -> dict:
             system="Tu estimes des délais de tâches. JSON uniquement.",
             messages=[{"role": "user", "content": prompt}]
         )
-        text = response.content[0].text.strip()
-        if text.startswith('```'):
-            text = text.replace('```json', '').replace('```', '').strip()
-        result = json.loads(text)
+        text = strip_json_fences(response.content[0].text)
+        result = orjson.loads(text)
         days = result.get('days', 7)
     except Exception:
         days = 7
@@ -764,10 +757,8 @@ Réponds en JSON:
             system="Tu décomposes des tâches en sous-tâches actionnables. JSON uniquement.",
             messages=[{"role": "user", "content": prompt}]
         )
-        text = response.content[0].text.strip()
-        if text.startswith('```'):
-            text = text.replace('```json', '').replace('```', '').strip()
-        result = json.loads(text)
+        text = strip_json_fences(response.content[0].text)
+        result = orjson.loads(text)
     except Exception:
         return {'error': 'AI decomposition failed'}
 
@@ -783,22 +774,21 @@ def update_session_context(event: dict) -> None:
 
     today = datetime.now().date().isoformat()
     cache_key = f"session:{today}"
-    append_to_cache(cache_key, 'session', event, ttl_hours=20, max_items=20)
+    append_to_cache(cache_key, event, ttl_hours=20, max_items=20)
 
 
 def get_session_context_summary() -> str:
     """Get a 2-3 line summary of today's session context."""
-    from src.services.ai_cache import get_cached
+    from src.services.ai_cache import get_cached_events
 
     today = datetime.now().date().isoformat()
     cache_key = f"session:{today}"
-    cached = get_cached(cache_key)
-    if not cached or not cached.get('events'):
+    events = get_cached_events(cache_key, limit=5)
+    if not events:
         return ""
 
-    events = cached['events']
     lines = []
-    for e in events[-5:]:
+    for e in events:
         lines.append(f"- {e.get('type', '?')}: {e.get('detail', '?')}")
     return "Contexte du jour:\n" + "\n".join(lines)
 
@@ -10,6 +10,9 @@ import json
 from datetime import datetime
 from dotenv import load_dotenv
 import anthropic
+import orjson
+
+from src.services.ai_client import strip_json_fences
 
 load_dotenv()
 
@@ -172,14 +175,9 @@ Règles:
             messages=[{"role": "user", "content": prompt}]
         )
 
-        text = response.content[0].text.strip()
-        # Nettoyer markdown
-        if '```' in text:
-            text = text.split('```')[1]
-            if text.startswith('json'):
-                text = text[4:]
+        text = strip_json_fences(response.content[0].text)
 
-        data = json.loads(text)
+        data = orjson.loads(text)
         return data.get('tweets', [])
 
     except Exception as e:
@@ -214,13 +212,9 @@ Style: Expert, insights, données si pertinent, vision Europe/France."""
             messages=[{"role": "user", "content": prompt}]
         )
 
-        text = response.content[0].text.strip()
-        if '```' in text:
-            text = text.split('```')[1]
-            if text.startswith('json'):
-                text = text[4:]
+        text = strip_json_fences(response.content[0].text)
 
-        return json.loads(text)
+        return orjson.loads(text)
 
     except Exception as e:
         return {"error": str(e)}
@@ -256,13 +250,9 @@ Varie les formats: tips, news, insights, annonces."""
             messages=[{"role": "user", "content": prompt}]
         )
 
-        text = response.content[0].text.strip()
-        if '```' in text:
-            text = text.split('```')[1]
-            if text.startswith('json'):
-                text = text[4:]
+        text = strip_json_fences(response.content[0].text)
 
-        data = json.loads(text)
+        data = orjson.loads(text)
         return data.get('calendar', [])
 
     except Exception as e:
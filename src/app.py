@@ -4,31 +4,163 @@ Alex Todo Dashboard - Backend API
 Dashboard personnel avec notifications Telegram
 """
 
+import fcntl
+import hashlib
+import hmac
+import os
+import sqlite3
+import threading
+import time
 from datetime import datetime, timedelta
+from functools import lru_cache
 
+import httpx
+import orjson
 import requests
 from apscheduler.schedulers.background import BackgroundScheduler
-from flask import Flask, request, jsonify, send_from_directory, Response
+from flask import Flask, request, jsonify, send_from_directory, stream_with_context, Response
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from itsdangerous import BadSignature, URLSafeTimedSerializer
 
-from src.config import APP_VERSION, DASHBOARD_ACCESS_TOKEN, DCA_APP_URL, DCA_BACKEND_URL, PORT, TIMEZONE
-from src.db import get_db, init_db
+from src.config import ANTHROPIC_API_KEY, APP_VERSION, DASHBOARD_ACCESS_TOKEN, DCA_APP_URL, DCA_BACKEND_URL, DEBUG, PORT, RUN_SCHEDULER, SCHEDULER_LOCK_PATH, TIMEZONE
+from src.db import HAS_RETURNING, SQL_PRIORITY_ORDER, get_conn, init_db, refresh_habit_streaks, release_conn, writer
 from src.services.daily_content import generate_daily_content
+from src.services.dashboard import SQL_ROADMAP, SQL_ROADMAP_BY_TYPE, compute_stats, todos_query
 from src.services.ai_cache import cleanup_expired, get_cached, set_cached
 from src.services.reminders import check_deadlines, record_daily_stats, send_daily_recap, spawn_recurring_tasks
-from src.services.telegram import send_telegram_message
+from src.services.telegram import queue_telegram_message, send_telegram_message
+
+
+class ORJSONProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson (C serializer) instead of stdlib json."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 
 app = Flask(__name__, static_folder='../static')
+app.json = ORJSONProvider(app)
 CORS(app)
 
- 
+
+def cached_json(payload, max_age=30):
+    """JSON response with an ETag and private caching; answers 304 when the client copy is current."""
+    body = payload if isinstance(payload, bytes) else orjson.dumps(payload)
+    response = Response(body, mimetype='application/json')
+    response.set_etag(hashlib.blake2b(body, digest_size=8).hexdigest())
+    response.cache_control.private = True
+    response.cache_control.max_age = max_age
+    return response.make_conditional(request)
+
+
+def rows_body(cursor):
+    """Encode a cursor's remaining rows as a JSON list, skipping sqlite3.Row wrappers."""
+    keys = [d[0] for d in cursor.description]
+    cursor.row_factory = None
+    return orjson.dumps([dict(zip(keys, row)) for row in cursor.fetchall()])
+
+
+def json_rows(cursor, max_age=None):
+    """Serialize a cursor's remaining rows as a JSON list response."""
+    body = rows_body(cursor)
+    if max_age is not None:
+        return cached_json(body, max_age)
+    return Response(body, mimetype='application/json')
+
+
+@lru_cache(maxsize=16)
+def recent_dates(today, days):
+    """ISO dates of the last `days` days ending at `today`, oldest first (cached per day)."""
+    return tuple((today - timedelta(days=i)).isoformat() for i in range(days - 1, -1, -1))
+
+
+# Updatable columns, in the order bound into the UPDATE statements
+_TODO_UPDATE_COLS = ('title', 'description', 'category', 'priority', 'status', 'deadline',
+                     'archived', 'recurrence_pattern', 'recurrence_end_date')
+_ROADMAP_UPDATE_COLS = ('title', 'description', 'type', 'status', 'target_date')
+_PROJECT_UPDATE_COLS = ('name', 'description', 'github_url', 'comment', 'status')
+
+_UPDATE_CACHE = {}
+
+
+def update_sql(table, cols):
+    """Return the UPDATE ... WHERE id = ? statement for a column tuple, built once per shape."""
+    key = (table, cols)
+    sql = _UPDATE_CACHE.get(key)
+    if sql is None:
+        sql = _UPDATE_CACHE[key] = f"UPDATE {table} SET {', '.join(f'{c} = ?' for c in cols)} WHERE id = ?"
+    return sql
+
+
+def masked_set(cols):
+    """SET fragments that only overwrite a column when its flag parameter is true."""
+    return ', '.join(f'{c} = CASE WHEN ? THEN ? ELSE {c} END' for c in cols)
+
+
+def masked_params(data, cols):
+    """(is_set, value) pairs for masked_set; an explicit null still clears the column."""
+    params = []
+    for c in cols:
+        if c in data:
+            params += (1, data[c])
+        else:
+            params += (0, None)
+    return params
+
+
+# Same str object per statement: sqlite3's statement cache lookup reuses its cached hash
+_RETURNING_CACHE = {}
+
+
+def execute_returning(cursor, table, sql, params, row_id=None):
+    """Run a single-row INSERT/UPDATE and return the written row as a dict (None if no row matched).
+
+    Uses RETURNING * when SQLite supports it; otherwise re-reads the row by id
+    (row_id, or lastrowid for inserts).
+    """
+    if HAS_RETURNING:
+        returning_sql = _RETURNING_CACHE.get(sql)
+        if returning_sql is None:
+            returning_sql = _RETURNING_CACHE[sql] = f'{sql} RETURNING *'
+        cursor.execute(returning_sql, params)
+        rows = cursor.fetchall()
+        return dict(rows[0]) if rows else None
+    cursor.execute(sql, params)
+    if not cursor.rowcount:
+        return None
+    cursor.execute(f'SELECT * FROM {table} WHERE id = ?', (cursor.lastrowid if row_id is None else row_id,))
+    row = cursor.fetchone()
+    return dict(row) if row else None
+
+
+# One fixed statement per table, whatever subset of fields the client sends
+_UPDATE_TODO_SQL = f'''
+    UPDATE todos SET {masked_set(_TODO_UPDATE_COLS)},
+        completed_at = CASE WHEN ? THEN ? ELSE completed_at END,
+        updated_at = ?
+    WHERE id = ?
+'''
+_UPDATE_ROADMAP_SQL = f'''
+    UPDATE roadmap_items SET {masked_set(_ROADMAP_UPDATE_COLS)},
+        completed_at = CASE WHEN ? THEN ? ELSE completed_at END,
+        updated_at = ?
+    WHERE id = ?
+'''
 
 
 # Initialize database FIRST
 init_db()
 
-# Initialize scheduler
-scheduler = BackgroundScheduler(timezone=TIMEZONE)
+# Initialize scheduler (one run per trigger: late runs coalesce, never overlap)
+scheduler = BackgroundScheduler(timezone=TIMEZONE, job_defaults={
+    'coalesce': True,
+    'max_instances': 1,
+    'misfire_grace_time': 60,
+})
 scheduler.add_job(check_deadlines, 'interval', minutes=15)
 scheduler.add_job(send_daily_recap, 'cron', hour=19, minute=0)  # 7 PM daily
 scheduler.add_job(generate_daily_content, 'cron', hour=6, minute=0)  # 6 AM daily
@@ -37,7 +169,38 @@ scheduler.add_job(record_daily_stats, 'cron', hour=23, minute=55)  # Record dail
 scheduler.add_job(spawn_recurring_tasks, 'cron', hour=0, minute=5)  # Spawn recurring tasks
 scheduler.add_job(lambda: send_morning_briefing(), 'cron', hour=8, minute=0)  # Morning briefing
 scheduler.add_job(lambda: send_weekly_review(), 'cron', day_of_week='sun', hour=20, minute=0)  # Weekly review
-scheduler.start()
+
+_scheduler_lock_file = None
+
+
+def acquire_scheduler_lock():
+    """Take the non-blocking scheduler flock; only the holder process runs the jobs.
+
+    The lock lives as long as the process, so a replacement worker picks it up
+    after the owner dies.
+    """
+    global _scheduler_lock_file
+    lock_file = open(SCHEDULER_LOCK_PATH, 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _scheduler_lock_file = lock_file
+    return True
+
+
+# Under app.run(debug=True) the reloader parent only watches files: leave the lock
+# to the child process (WERKZEUG_RUN_MAIN set) that actually serves requests
+_RELOADER_PARENT = __name__ == '__main__' and DEBUG and os.environ.get('WERKZEUG_RUN_MAIN') != 'true'
+
+# One scheduler per host, whatever the gunicorn worker count (RUN_SCHEDULER=0 opts out)
+if RUN_SCHEDULER and not _RELOADER_PARENT and acquire_scheduler_lock():
+    scheduler.start()
+
+    # Generate content on startup if needed (in the scheduler thread, not at import)
+    scheduler.add_job(generate_daily_content, 'date', run_date=datetime.now(scheduler.timezone) + timedelta(seconds=1),
+                      id='startup_daily_content', misfire_grace_time=600)
 
 
 def send_morning_briefing():
@@ -75,11 +238,38 @@ def send_weekly_review():
         pass
 
 
-# Generate content on startup if needed
-generate_daily_content()
+# ============== Security ==============
 
+AUTH_COOKIE_MAX_AGE = 86400
+LOGIN_PAGE_MAX_AGE = 3600
+_auth_serializer = URLSafeTimedSerializer(DASHBOARD_ACCESS_TOKEN, salt='dashboard-auth') if DASHBOARD_ACCESS_TOKEN else None
+
+
+def token_matches(token):
+    """Constant-time comparison of a submitted token with DASHBOARD_ACCESS_TOKEN."""
+    if not token or not DASHBOARD_ACCESS_TOKEN:
+        return False
+    return hmac.compare_digest(str(token).encode(), DASHBOARD_ACCESS_TOKEN.encode())
+
+
+def set_auth_cookie(response):
+    """Set a signed, timestamped auth cookie (the raw token never leaves the server)."""
+    response.set_cookie('dashboard_token', _auth_serializer.dumps({'u': 'dash'}),
+                        max_age=AUTH_COOKIE_MAX_AGE, httponly=True)
+    return response
+
+
+def has_valid_auth_cookie():
+    """Verify the signed auth cookie."""
+    cookie = request.cookies.get('dashboard_token')
+    if not cookie:
+        return False
+    try:
+        _auth_serializer.loads(cookie, max_age=AUTH_COOKIE_MAX_AGE)
+        return True
+    except BadSignature:
+        return False
 
-# ============== Security ==============
 
 @app.before_request
 def check_dashboard_access():
@@ -100,9 +290,8 @@ def check_dashboard_access():
     if request.path == '/login' or request.path == '/auth':
         return None
     
-    # Check token in query params or cookie
-    token = request.args.get('token') or request.cookies.get('dashboard_token')
-    if token != DASHBOARD_ACCESS_TOKEN:
+    # Check token in query params or signed cookie
+    if not token_matches(request.args.get('token')) and not has_valid_auth_cookie():
         # Redirect to login page instead of showing error
         from flask import redirect, url_for
         return redirect(url_for('login'))
@@ -110,6 +299,12 @@ def check_dashboard_access():
     return None
 
 
+@app.teardown_request
+def teardown_db(exc):
+    """Keep the per-thread connection open, but never leak a transaction into the next request."""
+    release_conn()
+
+
 # ============== API Routes ==============
 
 @app.route('/api/version')
@@ -121,134 +316,8 @@ def api_version():
 @app.route('/login')
 def login():
     """Login page for token authentication."""
-    return '''
-<!DOCTYPE html>
-<html lang="fr">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>🔒 Alex Todo Dashboard - Login</title>
-    <style>
-        * { margin: 0; padding: 0; box-sizing: border-box; }
-        body {
-            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            min-height: 100vh;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            padding: 20px;
-        }
-        .login-container {
-            background: white;
-            border-radius: 20px;
-            padding: 40px;
-            box-shadow: 0 20px 60px rgba(0,0,0,0.3);
-            max-width: 400px;
-            width: 100%;
-        }
-        h1 {
-            color: #333;
-            margin-bottom: 10px;
-            font-size: 28px;
-        }
-        p {
-            color: #666;
-            margin-bottom: 30px;
-        }
-        .input-group {
-            margin-bottom: 20px;
-        }
-        label {
-            display: block;
-            color: #555;
-            margin-bottom: 8px;
-            font-weight: 500;
-        }
-        input[type="password"] {
-            width: 100%;
-            padding: 12px 16px;
-            border: 2px solid #e0e0e0;
-            border-radius: 10px;
-            font-size: 16px;
-            transition: border-color 0.3s;
-        }
-        input[type="password"]:focus {
-            outline: none;
-            border-color: #667eea;
-        }
-        button {
-            width: 100%;
-            padding: 14px;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            color: white;
-            border: none;
-            border-radius: 10px;
-            font-size: 16px;
-            font-weight: 600;
-            cursor: pointer;
-            transition: transform 0.2s;
-        }
-        button:hover {
-            transform: translateY(-2px);
-        }
-        button:active {
-            transform: translateY(0);
-        }
-        .error {
-            background: #fee;
-            color: #c33;
-            padding: 12px;
-            border-radius: 8px;
-            margin-bottom: 20px;
-            display: none;
-        }
-    </style>
-</head>
-<body>
-    <div class="login-container">
-        <h1>🔒 Dashboard Login</h1>
-        <p>Entre ton token d'accès</p>
-        
-        <div class="error" id="error">Token invalide</div>
-        
-        <form id="loginForm">
-            <div class="input-group">
-                <label for="token">Token d'accès</label>
-                <input type="password" id="token" name="token" placeholder="Entre ton token secret" required autofocus>
-            </div>
-            <button type="submit">🚀 Accéder au Dashboard</button>
-        </form>
-    </div>
-    
-    <script>
-        document.getElementById('loginForm').addEventListener('submit', async (e) => {
-            e.preventDefault();
-            const token = document.getElementById('token').value;
-            const error = document.getElementById('error');
-            
-            try {
-                const response = await fetch('/auth', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ token })
-                });
-                
-                if (response.ok) {
-                    window.location.href = '/';
-                } else {
-                    error.style.display = 'block';
-                    setTimeout(() => error.style.display = 'none', 3000);
-                }
-            } catch (err) {
-                error.textContent = 'Erreur de connexion';
-                error.style.display = 'block';
-            }
-        });
-    </script>
-</body>
-</html>
-    '''
+    # Static file: conditional GETs (ETag/Last-Modified) and a one-hour browser cache
+    return send_from_directory(app.static_folder, 'login.html', max_age=LOGIN_PAGE_MAX_AGE)
 
 
 @app.route('/auth', methods=['POST'])
@@ -257,10 +326,8 @@ def authenticate():
     data = request.json
     token = data.get('token')
     
-    if token == DASHBOARD_ACCESS_TOKEN:
-        response = jsonify({'success': True})
-        response.set_cookie('dashboard_token', DASHBOARD_ACCESS_TOKEN, max_age=86400, httponly=True)
-        return response
+    if token_matches(token):
+        return set_auth_cookie(jsonify({'success': True}))
     
     return jsonify({'success': False}), 401
 
@@ -298,8 +365,8 @@ def index():
     """Serve the dashboard."""
     response = send_from_directory(app.static_folder, 'index.html')
     # Set cookie if valid token in URL (for subsequent requests)
-    if DASHBOARD_ACCESS_TOKEN and request.args.get('token') == DASHBOARD_ACCESS_TOKEN:
-        response.set_cookie('dashboard_token', DASHBOARD_ACCESS_TOKEN, max_age=86400, httponly=True)
+    if token_matches(request.args.get('token')):
+        set_auth_cookie(response)
     return response
 
 
@@ -315,6 +382,23 @@ def archives():
     return send_from_directory(app.static_folder, 'archives.html')
 
 
+# Shared keep-alive pool for the DCA upstream (HTTP/2 when the upstream speaks TLS)
+_dca_client = httpx.Client(
+    http2=True,
+    timeout=30.0,
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+)
+
+# Hop-by-hop headers (RFC 7230 §6.1) never cross the proxy
+_HOP_BY_HOP = frozenset({
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailers', 'transfer-encoding', 'upgrade',
+})
+_FORBIDDEN_REQ = _HOP_BY_HOP | {'host'}
+# httpx decodes the body, so the upstream encoding/length no longer apply
+_FORBIDDEN_RESP = _HOP_BY_HOP | {'content-encoding', 'content-length'}
+
+
 def proxy_dca(path):
     """Proxy requests to the DCA Next.js server."""
     base_url = DCA_APP_URL.rstrip('/')
@@ -322,26 +406,27 @@ def proxy_dca(path):
     if request.query_string:
         target_url = f"{target_url}?{request.query_string.decode()}"
 
-    headers = {key: value for key, value in request.headers if key.lower() != 'host'}
+    # Cookies travel in the forwarded Cookie header
+    headers = [(key, value) for key, value in request.headers if key.lower() not in _FORBIDDEN_REQ]
 
     try:
-        resp = requests.request(
+        upstream_request = _dca_client.build_request(
             request.method,
             target_url,
             headers=headers,
-            data=request.get_data(),
-            cookies=request.cookies,
-            allow_redirects=False,
-            timeout=30
+            content=request.get_data(),
         )
-    except requests.RequestException as exc:
+        resp = _dca_client.send(upstream_request, stream=True)
+    except httpx.HTTPError as exc:
         return jsonify({'error': 'DCA server unavailable', 'detail': str(exc)}), 502
 
-    excluded_headers = {'content-encoding', 'content-length', 'transfer-encoding', 'connection'}
-    response = Response(resp.content, resp.status_code)
-    for key, value in resp.headers.items():
-        if key.lower() not in excluded_headers:
-            response.headers[key] = value
+    # multi_items keeps repeated headers such as Set-Cookie intact
+    response_headers = [
+        (key, value) for key, value in resp.headers.multi_items()
+        if key.lower() not in _FORBIDDEN_RESP
+    ]
+    response = Response(resp.iter_bytes(), resp.status_code, headers=response_headers)
+    response.call_on_close(resp.close)
     return response
 
 
@@ -370,10 +455,16 @@ def dca_analyze_proxy():
     return proxy_dca('api/analyze')
 
 
+# Changes whenever a todo is added, deleted, edited (updated_at) or reminded
+SQL_TODOS_FINGERPRINT = '''
+    SELECT COUNT(*), MAX(id), MAX(updated_at), TOTAL(reminder_sent) FROM todos
+'''
+
+
 @app.route('/api/todos', methods=['GET'])
 def get_todos():
     """Get all todos with optional filters."""
-    conn = get_db()
+    conn = get_conn()
     cursor = conn.cursor()
 
     status = request.args.get('status')
@@ -381,44 +472,32 @@ def get_todos():
     archived = request.args.get('archived')
     include_children = request.args.get('include_children')
 
-    query = '''SELECT t.*,
-        (SELECT COUNT(*) FROM todos st WHERE st.parent_todo_id = t.id) as subtask_count,
-        (SELECT COUNT(*) FROM todos st WHERE st.parent_todo_id = t.id AND st.status = 'completed') as subtask_done_count
-        FROM todos t WHERE 1=1'''
-    params = []
-
-    # Hide sub-tasks by default
-    if not include_children:
-        query += ' AND t.parent_todo_id IS NULL'
-
-    if archived == '1':
-        query += ' AND t.archived = 1'
-    elif archived == '0':
-        query += ' AND t.archived = 0'
+    by_status = bool(status) and status != 'all'
+    by_category = bool(category) and category != 'all'
+    params = ([status] if by_status else []) + ([category] if by_category else [])
+    query = todos_query(bool(include_children), archived if archived in ('0', '1') else None,
+                        by_status, by_category)
+
+    # Unchanged table fingerprint: the client's copy is current, skip the fetch and encode
+    cursor.execute(SQL_TODOS_FINGERPRINT)
+    fingerprint = repr(tuple(cursor.fetchone())).encode() + request.query_string
+    etag = hashlib.blake2b(fingerprint, digest_size=8).hexdigest()
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
     else:
-        # Default behavior: hide archived AND completed unless specifically requested
-        query += ' AND t.archived = 0 AND t.status != "completed"'
-
-    if status and status != 'all':
-        query += ' AND t.status = ?'
-        params.append(status)
-    if category and category != 'all':
-        query += ' AND t.category = ?'
-        params.append(category)
-
-    query += ' ORDER BY CASE t.priority WHEN "urgent" THEN 1 WHEN "important" THEN 2 ELSE 3 END, t.deadline ASC'
-
-    cursor.execute(query, params)
-    todos = [dict(row) for row in cursor.fetchall()]
-    conn.close()
+        cursor.execute(query, params)
+        response = json_rows(cursor)
+    response.set_etag(etag, weak=True)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
 
-    return jsonify(todos)
+    return response
 
 
 @app.route('/api/todos/archived', methods=['GET'])
 def get_archived_todos():
     """Get archived todos."""
-    conn = get_db()
+    conn = get_conn()
     cursor = conn.cursor()
 
     cursor.execute('''
@@ -426,9 +505,8 @@ def get_archived_todos():
         WHERE archived = 1
         ORDER BY completed_at DESC, updated_at DESC
     ''')
-    todos = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return jsonify(todos)
+    response = json_rows(cursor)
+    return response
 
 
 @app.route('/api/todos', methods=['POST'])
@@ -436,25 +514,23 @@ def create_todo():
     """Create a new todo."""
     data = request.json
 
-    conn = get_db()
+    conn = get_conn()
     cursor = conn.cursor()
 
-    cursor.execute('''
-        INSERT INTO todos (title, description, category, priority, deadline, recurrence_pattern, recurrence_end_date, parent_todo_id)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
-        data.get('title'),
-        data.get('description'),
-        data.get('category', 'general'),
-        data.get('priority', 'normal'),
-        data.get('deadline'),
-        data.get('recurrence_pattern'),
-        data.get('recurrence_end_date'),
-        data.get('parent_todo_id')
-    ))
-
-    todo_id = cursor.lastrowid
-    conn.commit()
+    with writer(conn):
+        todo = execute_returning(cursor, 'todos', '''
+            INSERT INTO todos (title, description, category, priority, deadline, recurrence_pattern, recurrence_end_date, parent_todo_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            data.get('title'),
+            data.get('description'),
+            data.get('category', 'general'),
+            data.get('priority', 'normal'),
+            data.get('deadline'),
+            data.get('recurrence_pattern'),
+            data.get('recurrence_end_date'),
+            data.get('parent_todo_id')
+        ))
 
     # Send Telegram notification for new task
     priority_emoji = {'urgent': '🔴', 'important': '🟠', 'normal': '🟡'}.get(data.get('priority', 'normal'), '⚪')
@@ -466,7 +542,7 @@ def create_todo():
     if data.get('deadline'):
         message += f"\n⏳ Deadline: {data.get('deadline')}"
 
-    send_telegram_message(message)
+    queue_telegram_message(message)
 
     # Track session context
     try:
@@ -479,10 +555,6 @@ def create_todo():
     from src.services.ai_cache import invalidate_pattern
     invalidate_pattern('prioritize:')
 
-    cursor.execute('SELECT * FROM todos WHERE id = ?', (todo_id,))
-    todo = dict(cursor.fetchone())
-    conn.close()
-
     return jsonify(todo), 201
 
 
@@ -491,58 +563,33 @@ def update_todo(todo_id):
     """Update a todo."""
     data = request.json
 
-    conn = get_db()
+    conn = get_conn()
     cursor = conn.cursor()
 
-    # Build dynamic update query
-    updates = []
-    params = []
-
     status_completed = data.get('status') == 'completed'
+    now_iso = datetime.now().isoformat()
 
-    for field in ['title', 'description', 'category', 'priority', 'status', 'deadline', 'archived', 'recurrence_pattern', 'recurrence_end_date']:
-        if field in data:
-            if field == 'archived' and status_completed:
-                continue
-            updates.append(f'{field} = ?')
-            params.append(data[field])
-
-    if status_completed:
-        updates.append('completed_at = ?')
-        params.append(datetime.now().isoformat())
-        # Automatically archive completed tasks
-        updates.append('archived = ?')
-        params.append(1)
-
-    updates.append('updated_at = ?')
-    params.append(datetime.now().isoformat())
-
-    params.append(todo_id)
+    # Automatically archive completed tasks
+    fields = {**data, 'archived': 1} if status_completed else data
+    params = masked_params(fields, _TODO_UPDATE_COLS)
+    params += (status_completed, now_iso, now_iso, todo_id)
 
-    cursor.execute(f'''
-        UPDATE todos SET {', '.join(updates)} WHERE id = ?
-    ''', params)
-
-    conn.commit()
+    with writer(conn):
+        todo = execute_returning(cursor, 'todos', _UPDATE_TODO_SQL, params, todo_id)
+    if todo is None:
+        return jsonify({'error': 'Todo not found'}), 404
 
     # Send notification if task completed
-    if data.get('status') == 'completed':
-        cursor.execute('SELECT title FROM todos WHERE id = ?', (todo_id,))
-        todo = cursor.fetchone()
-        if todo:
-            send_telegram_message(f"✅ <b>Tâche terminée!</b>\n\n{todo['title']}\n\n<i>Bravo Alexandre! 🎉</i>")
-            # Track session context + invalidate priorities cache
-            try:
-                from src.agents.assistant_agent import update_session_context
-                update_session_context({'type': 'task_completed', 'detail': todo['title']})
-            except Exception:
-                pass
-            from src.services.ai_cache import invalidate_pattern
-            invalidate_pattern('prioritize:')
-
-    cursor.execute('SELECT * FROM todos WHERE id = ?', (todo_id,))
-    todo = dict(cursor.fetchone())
-    conn.close()
+    if status_completed:
+        queue_telegram_message(f"✅ <b>Tâche terminée!</b>\n\n{todo['title']}\n\n<i>Bravo Alexandre! 🎉</i>")
+        # Track session context + invalidate priorities cache
+        try:
+            from src.agents.assistant_agent import update_session_context
+            update_session_context({'type': 'task_completed', 'detail': todo['title']})
+        except Exception:
+            pass
+        from src.services.ai_cache import invalidate_pattern
+        invalidate_pattern('prioritize:')
 
     return jsonify(todo)
 
@@ -550,88 +597,61 @@ def update_todo(todo_id):
 @app.route('/api/todos/<int:todo_id>', methods=['DELETE'])
 def delete_todo(todo_id):
     """Delete a todo."""
-    conn = get_db()
+    conn = get_conn()
     cursor = conn.cursor()
-    cursor.execute('DELETE FROM todos WHERE id = ?', (todo_id,))
-    conn.commit()
-    conn.close()
+    with writer(conn):
+        cursor.execute('DELETE FROM todos WHERE id = ?', (todo_id,))
 
     return jsonify({'success': True})
 
 
+SQL_SUBTASKS = f'''
+    SELECT * FROM todos WHERE parent_todo_id = ?
+    ORDER BY {SQL_PRIORITY_ORDER}, created_at ASC
+'''
+
+
 @app.route('/api/todos/<int:todo_id>/subtasks', methods=['GET'])
 def get_subtasks(todo_id):
     """Get subtasks for a specific todo."""
-    conn = get_db()
+    conn = get_conn()
     cursor = conn.cursor()
-    cursor.execute('''
-        SELECT * FROM todos WHERE parent_todo_id = ?
-        ORDER BY CASE priority WHEN 'urgent' THEN 1 WHEN 'important' THEN 2 ELSE 3 END, created_at ASC
-    ''', (todo_id,))
-    subtasks = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return jsonify(subtasks)
+    cursor.execute(SQL_SUBTASKS, (todo_id,))
+    return json_rows(cursor)
+
+
+# Categories only change with a schema seed, so the encoded list is kept per process
+CATEGORIES_TTL = 300
+_categories_cache = {'body': None, 'expires': 0.0}
+
+
+def invalidate_categories_cache():
+    """Drop the cached category list (call after any category write)."""
+    _categories_cache['expires'] = 0.0
 
 
 @app.route('/api/categories', methods=['GET'])
 def get_categories():
     """Get all categories."""
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM categories')
-    categories = [dict(row) for row in cursor.fetchall()]
-    conn.close()
+    now = time.monotonic()
+    if now >= _categories_cache['expires']:
+        conn = get_conn()
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM categories')
+        _categories_cache['body'] = rows_body(cursor)
+        _categories_cache['expires'] = now + CATEGORIES_TTL
 
-    return jsonify(categories)
+    return cached_json(_categories_cache['body'], max_age=CATEGORIES_TTL)
 
 
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
     """Get dashboard statistics."""
-    conn = get_db()
+    conn = get_conn()
     cursor = conn.cursor()
 
-    # Total counts
-    cursor.execute('SELECT COUNT(*) as total FROM todos')
-    total = cursor.fetchone()['total']
-
-    cursor.execute("SELECT COUNT(*) as completed FROM todos WHERE status = 'completed'")
-    completed = cursor.fetchone()['completed']
-
-    cursor.execute("SELECT COUNT(*) as pending FROM todos WHERE status = 'pending'")
-    pending = cursor.fetchone()['pending']
-
-    # Today's tasks
-    today = datetime.now().date().isoformat()
-    cursor.execute('''
-        SELECT COUNT(*) as today_completed
-        FROM todos
-        WHERE status = 'completed'
-        AND date(completed_at) = ?
-    ''', (today,))
-    today_completed = cursor.fetchone()['today_completed']
-
-    # Overdue tasks
-    cursor.execute('''
-        SELECT COUNT(*) as overdue
-        FROM todos
-        WHERE status = 'pending'
-        AND deadline < ?
-    ''', (datetime.now().isoformat(),))
-    overdue = cursor.fetchone()['overdue']
-
-    conn.close()
-
-    completion_rate = round((completed / total * 100) if total > 0 else 0, 1)
-
-    return jsonify({
-        'total': total,
-        'completed': completed,
-        'pending': pending,
-        'today_completed': today_completed,
-        'overdue': overdue,
-        'completion_rate': completion_rate
-    })
+    # All counters in a single scan
+    return jsonify(compute_stats(cursor))
 
 
 @app.route('/api/notify', methods=['POST'])
@@ -688,25 +708,17 @@ def get_briefing():
 @app.route('/api/roadmap', methods=['GET'])
 def get_roadmap():
     """Get all roadmap items with optional type filter."""
-    conn = get_db()
+    conn = get_conn()
     cursor = conn.cursor()
     
     item_type = request.args.get('type')
-    
-    query = 'SELECT * FROM roadmap_items WHERE 1=1'
-    params = []
-    
     if item_type:
-        query += ' AND type = ?'
-        params.append(item_type)
-    
-    query += ' ORDER BY target_date ASC, created_at DESC'
-    
-    cursor.execute(query, params)
-    items = [dict(row) for row in cursor.fetchall()]
-    conn.close()
+        cursor.execute(SQL_ROADMAP_BY_TYPE, (item_type,))
+    else:
+        cursor.execute(SQL_ROADMAP)
+    response = json_rows(cursor, max_age=0)
     
-    return jsonify(items)
+    return response
 
 
 @app.route('/api/roadmap', methods=['POST'])
@@ -714,26 +726,20 @@ def create_roadmap_item():
     """Create a new roadmap item."""
     data = request.json
     
-    conn = get_db()
+    conn = get_conn()
     cursor = conn.cursor()
     
-    cursor.execute('''
-        INSERT INTO roadmap_items (title, description, type, target_date, status)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (
-        data.get('title'),
-        data.get('description'),
-        data.get('type', 'mid_term'),
-        data.get('target_date'),
-        data.get('status', 'in_progress')
-    ))
-    
-    item_id = cursor.lastrowid
-    conn.commit()
-    
-    cursor.execute('SELECT * FROM roadmap_items WHERE id = ?', (item_id,))
-    item = dict(cursor.fetchone())
-    conn.close()
+    with writer(conn):
+        item = execute_returning(cursor, 'roadmap_items', '''
+            INSERT INTO roadmap_items (title, description, type, target_date, status)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (
+            data.get('title'),
+            data.get('description'),
+            data.get('type', 'mid_term'),
+            data.get('target_date'),
+            data.get('status', 'in_progress')
+        ))
     
     return jsonify(item), 201
 
@@ -743,35 +749,17 @@ def update_roadmap_item(item_id):
     """Update a roadmap item."""
     data = request.json
     
-    conn = get_db()
+    conn = get_conn()
     cursor = conn.cursor()
     
-    updates = []
-    params = []
-    
-    for field in ['title', 'description', 'type', 'status', 'target_date']:
-        if field in data:
-            updates.append(f'{field} = ?')
-            params.append(data[field])
-    
-    if 'status' in data and data['status'] == 'completed':
-        updates.append('completed_at = ?')
-        params.append(datetime.now().isoformat())
-    
-    updates.append('updated_at = ?')
-    params.append(datetime.now().isoformat())
-    
-    params.append(item_id)
-    
-    cursor.execute(f'''
-        UPDATE roadmap_items SET {', '.join(updates)} WHERE id = ?
-    ''', params)
-    
-    conn.commit()
+    now_iso = datetime.now().isoformat()
+    params = masked_params(data, _ROADMAP_UPDATE_COLS)
+    params += (data.get('status') == 'completed', now_iso, now_iso, item_id)
     
-    cursor.execute('SELECT * FROM roadmap_items WHERE id = ?', (item_id,))
-    item = dict(cursor.fetchone())
-    conn.close()
+    with writer(conn):
+        item = execute_returning(cursor, 'roadmap_items', _UPDATE_ROADMAP_SQL, params, item_id)
+    if item is None:
+        return jsonify({'error': 'Roadmap item not found'}), 404
     
     return jsonify(item)
 
@@ -781,35 +769,30 @@ def update_roadmap_item(item_id):
 @app.route('/api/projects', methods=['GET'])
 def get_projects():
     """Get all projects."""
-    conn = get_db()
+    conn = get_conn()
     cursor = conn.cursor()
     cursor.execute('SELECT * FROM projects ORDER BY created_at DESC')
-    projects = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return jsonify(projects)
+    response = json_rows(cursor, max_age=0)
+    return response
 
 
 @app.route('/api/projects', methods=['POST'])
 def create_project():
     """Create a new project."""
     data = request.json
-    conn = get_db()
+    conn = get_conn()
     cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO projects (name, description, github_url, comment, status)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (
-        data.get('name'),
-        data.get('description'),
-        data.get('github_url'),
-        data.get('comment'),
-        data.get('status', 'active')
-    ))
-    project_id = cursor.lastrowid
-    conn.commit()
-    cursor.execute('SELECT * FROM projects WHERE id = ?', (project_id,))
-    project = dict(cursor.fetchone())
-    conn.close()
+    with writer(conn):
+        project = execute_returning(cursor, 'projects', '''
+            INSERT INTO projects (name, description, github_url, comment, status)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (
+            data.get('name'),
+            data.get('description'),
+            data.get('github_url'),
+            data.get('comment'),
+            data.get('status', 'active')
+        ))
     return jsonify(project), 201
 
 
@@ -817,39 +800,36 @@ def create_project():
 def update_project(project_id):
     """Update a project."""
     data = request.json
-    conn = get_db()
+    conn = get_conn()
     cursor = conn.cursor()
-    updates = []
+    cols = []
     params = []
-    for field in ['name', 'description', 'github_url', 'comment', 'status']:
+    for field in _PROJECT_UPDATE_COLS:
         if field in data:
-            updates.append(f'{field} = ?')
+            cols.append(field)
             params.append(data[field])
     
-    if not updates:
-        conn.close()
+    if not cols:
         return jsonify({'error': 'No fields to update'}), 400
         
-    updates.append('updated_at = ?')
+    cols.append('updated_at')
     params.append(datetime.now().isoformat())
     params.append(project_id)
     
-    cursor.execute(f'UPDATE projects SET {", ".join(updates)} WHERE id = ?', params)
-    conn.commit()
-    cursor.execute('SELECT * FROM projects WHERE id = ?', (project_id,))
-    project = dict(cursor.fetchone())
-    conn.close()
+    with writer(conn):
+        project = execute_returning(cursor, 'projects', update_sql('projects', tuple(cols)), params, project_id)
+    if project is None:
+        return jsonify({'error': 'Project not found'}), 404
     return jsonify(project)
 
 
 @app.route('/api/projects/<int:project_id>', methods=['DELETE'])
 def delete_project(project_id):
     """Delete a project."""
-    conn = get_db()
+    conn = get_conn()
     cursor = conn.cursor()
-    cursor.execute('DELETE FROM projects WHERE id = ?', (project_id,))
-    conn.commit()
-    conn.close()
+    with writer(conn):
+        cursor.execute('DELETE FROM projects WHERE id = ?', (project_id,))
     return jsonify({'success': True})
 
 
@@ -870,42 +850,107 @@ def dca_analyze():
 @app.route('/api/roadmap/<int:item_id>', methods=['DELETE'])
 def delete_roadmap_item(item_id):
     """Delete a roadmap item."""
-    conn = get_db()
+    conn = get_conn()
     cursor = conn.cursor()
-    cursor.execute('DELETE FROM roadmap_items WHERE id = ?', (item_id,))
-    conn.commit()
-    conn.close()
+    with writer(conn):
+        cursor.execute('DELETE FROM roadmap_items WHERE id = ?', (item_id,))
     
     return jsonify({'success': True})
 
 
 # ============== DAILY CONTENT ENDPOINTS ==============
 
-@app.route('/api/daily-content', methods=['GET'])
-def get_daily_content():
-    """Get today's quote and fun fact."""
-    today = datetime.now().date().isoformat()
-    
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM daily_content WHERE date = ?', (today,))
-    content = cursor.fetchone()
-    conn.close()
-    
-    if content:
-        return jsonify(dict(content))
-    
-    # Generate if not exists
-    generate_daily_content()
-    
-    conn = get_db()
+# Changes once a day (or on an explicit regenerate, whose POST returns the new body)
+DAILY_CONTENT_MAX_AGE = 600
+# Per process: the row id is checked against SQLite on each hit, so a regenerate
+# handled by another worker (new row, new AUTOINCREMENT id) is picked up
+_daily_cache = {'date': None, 'id': None, 'body': None}
+_daily_cache_lock = threading.Lock()
+
+
+def _daily_max_age(now):
+    """DAILY_CONTENT_MAX_AGE, capped so no client keeps yesterday's content past midnight."""
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return min(DAILY_CONTENT_MAX_AGE, int((midnight - now).total_seconds()))
+
+
+def _store_daily_content(today, content):
+    """Serialize a daily_content row into the in-process cache and return the body."""
+    body = orjson.dumps(content)
+    with _daily_cache_lock:
+        _daily_cache['date'] = today
+        _daily_cache['id'] = content['id']
+        _daily_cache['body'] = body
+    return body
+
+
+def _cache_daily_content(today):
+    """Load today's content from SQLite into the in-process cache. Returns the body or None."""
+    conn = get_conn()
     cursor = conn.cursor()
     cursor.execute('SELECT * FROM daily_content WHERE date = ?', (today,))
     content = cursor.fetchone()
-    conn.close()
-    
-    if content:
-        return jsonify(dict(content))
+
+    if not content:
+        return None
+    return _store_daily_content(today, dict(content))
+
+
+# Background generation for GET /api/daily-content (the Claude call takes seconds)
+DAILY_RETRY_SECONDS = 300
+_daily_generation = {'thread': None, 'failed_date': None, 'failed_at': 0.0}
+
+
+def _generate_daily_in_background(today):
+    content = None
+    try:
+        # generate_daily_content returns the stored row, no second SELECT needed
+        content = generate_daily_content()
+    except Exception:
+        pass
+    if content and content['date'] == today:
+        _store_daily_content(today, content)
+    else:
+        with _daily_cache_lock:
+            _daily_generation['failed_date'] = today
+            _daily_generation['failed_at'] = time.monotonic()
+
+
+def _start_daily_generation(today):
+    """Start (or join) today's background generation. False if it failed within DAILY_RETRY_SECONDS."""
+    with _daily_cache_lock:
+        thread = _daily_generation['thread']
+        if thread is not None and thread.is_alive():
+            return True
+        if (_daily_generation['failed_date'] == today
+                and time.monotonic() - _daily_generation['failed_at'] < DAILY_RETRY_SECONDS):
+            return False
+        thread = threading.Thread(target=_generate_daily_in_background, args=(today,),
+                                  name='daily-content', daemon=True)
+        _daily_generation['thread'] = thread
+        thread.start()
+    return True
+
+
+@app.route('/api/daily-content', methods=['GET'])
+def get_daily_content():
+    """Get today's quote and fun fact."""
+    now = datetime.now()
+    today = now.date().isoformat()
+
+    row = get_conn().execute('SELECT id FROM daily_content WHERE date = ?', (today,)).fetchone()
+    if row:
+        with _daily_cache_lock:
+            current = _daily_cache['date'] == today and _daily_cache['id'] == row['id']
+            body = _daily_cache['body'] if current else None
+        if body is None:
+            body = _cache_daily_content(today)
+        if body:
+            return cached_json(body, max_age=_daily_max_age(now))
+
+    # Generate if not exists, off the request thread: the client polls on 202
+    if ANTHROPIC_API_KEY and _start_daily_generation(today):
+        return jsonify({'status': 'generating'}), 202
     
     return jsonify({'error': 'Could not generate daily content'}), 500
 
@@ -914,23 +959,19 @@ def get_daily_content():
 def regenerate_daily_content():
     """Force regenerate daily content."""
     today = datetime.now().date().isoformat()
+
+    with _daily_cache_lock:
+        _daily_cache['date'] = None
+        _daily_generation['failed_date'] = None
     
-    conn = get_db()
+    conn = get_conn()
     cursor = conn.cursor()
-    cursor.execute('DELETE FROM daily_content WHERE date = ?', (today,))
-    conn.commit()
-    conn.close()
-    
-    generate_daily_content()
-    
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM daily_content WHERE date = ?', (today,))
-    content = cursor.fetchone()
-    conn.close()
+    with writer(conn):
+        cursor.execute('DELETE FROM daily_content WHERE date = ?', (today,))
     
+    content = generate_daily_content(force=True)
     if content:
-        return jsonify(dict(content))
+        return Response(_store_daily_content(today, content), mimetype='application/json')
     
     return jsonify({'error': 'Could not generate daily content'}), 500
 
@@ -980,25 +1021,23 @@ def apply_subtasks(todo_id):
     data = request.json
     subtasks = data.get('subtasks', [])
 
-    conn = get_db()
+    conn = get_conn()
     cursor = conn.cursor()
 
     created = []
-    for st in subtasks:
-        cursor.execute('''
-            INSERT INTO todos (title, category, priority, parent_todo_id, description)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (
-            st.get('title'),
-            st.get('category') or data.get('category', 'general'),
-            st.get('priority', 'normal'),
-            todo_id,
-            st.get('estimated_time', '')
-        ))
-        created.append({'id': cursor.lastrowid, 'title': st.get('title')})
-
-    conn.commit()
-    conn.close()
+    with writer(conn):
+        for st in subtasks:
+            cursor.execute('''
+                INSERT INTO todos (title, category, priority, parent_todo_id, description)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (
+                st.get('title'),
+                st.get('category') or data.get('category', 'general'),
+                st.get('priority', 'normal'),
+                todo_id,
+                st.get('estimated_time', '')
+            ))
+            created.append({'id': cursor.lastrowid, 'title': st.get('title')})
 
     return jsonify({'created': created, 'count': len(created)})
 
@@ -1020,12 +1059,11 @@ def get_weekly_review():
 def get_burndown():
     """Get burndown chart data from task_history."""
     days = int(request.args.get('days', 7))
-    conn = get_db()
+    conn = get_conn()
     cursor = conn.cursor()
 
     data = []
-    for i in range(days - 1, -1, -1):
-        date = (datetime.now() - timedelta(days=i)).date().isoformat()
+    for date in recent_dates(datetime.now().date(), days):
         cursor.execute('SELECT * FROM task_history WHERE date = ?', (date,))
         row = cursor.fetchone()
         if row:
@@ -1056,38 +1094,34 @@ def get_burndown():
         for i, d in enumerate(data):
             d['ideal'] = round(max(start_remaining - (ideal_step * i), 0))
 
-    conn.close()
     return jsonify({'data': data})
 
 
 # ============== VUE JOURNALIÈRE ==============
 
+SQL_TODAY_TODOS = f'''
+    SELECT * FROM todos
+    WHERE status = 'pending'
+    AND (
+        (deadline IS NOT NULL AND date(deadline) <= ?)
+        OR priority IN ('urgent', 'important')
+    )
+    ORDER BY {SQL_PRIORITY_ORDER}, deadline ASC NULLS LAST
+'''
+
+
 @app.route('/api/todos/today', methods=['GET'])
 def get_today_todos():
     """Get today's tasks sorted by priority."""
-    conn = get_db()
+    conn = get_conn()
     cursor = conn.cursor()
     
     today = datetime.now().date().isoformat()
-    tomorrow = (datetime.now() + timedelta(days=1)).date().isoformat()
     
     # Tasks due today OR pending with high priority
-    cursor.execute('''
-        SELECT * FROM todos
-        WHERE status = 'pending'
-        AND (
-            (deadline IS NOT NULL AND date(deadline) <= ?)
-            OR priority IN ('urgent', 'important')
-        )
-        ORDER BY 
-            CASE priority WHEN 'urgent' THEN 1 WHEN 'important' THEN 2 ELSE 3 END,
-            deadline ASC NULLS LAST
-    ''', (today,))
+    cursor.execute(SQL_TODAY_TODOS, (today,))
     
-    todos = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    
-    return jsonify(todos)
+    return json_rows(cursor)
 
 
 # ============== ANALYTICS ==============
@@ -1096,41 +1130,41 @@ def get_today_todos():
 def get_analytics():
     """Get productivity analytics for the last N days."""
     days = int(request.args.get('days', 7))
-    conn = get_db()
+    conn = get_conn()
     cursor = conn.cursor()
     
+    today = datetime.now().date()
+    dates = recent_dates(today, days)
+    start = dates[0] if dates else today.isoformat()
+
+    # Per-day counts for the whole period in two grouped queries
+    cursor.execute('''
+        SELECT date(completed_at) as day, COUNT(*) as count FROM todos
+        WHERE status = 'completed' AND date(completed_at) >= ?
+        GROUP BY day
+    ''', (start,))
+    completed_by_day = {row['day']: row['count'] for row in cursor.fetchall()}
+
+    cursor.execute('''
+        SELECT date(created_at) as day, COUNT(*) as count FROM todos
+        WHERE date(created_at) >= ?
+        GROUP BY day
+    ''', (start,))
+    created_by_day = {row['day']: row['count'] for row in cursor.fetchall()}
+
     # Get daily stats for the period
     stats = []
-    for i in range(days - 1, -1, -1):
-        date = (datetime.now() - timedelta(days=i)).date().isoformat()
-        
-        cursor.execute('''
-            SELECT COUNT(*) as count FROM todos
-            WHERE status = 'completed' AND date(completed_at) = ?
-        ''', (date,))
-        completed = cursor.fetchone()['count']
-        
-        cursor.execute('''
-            SELECT COUNT(*) as count FROM todos
-            WHERE date(created_at) = ?
-        ''', (date,))
-        created = cursor.fetchone()['count']
-        
+    for date in dates:
         stats.append({
             'date': date,
-            'completed': completed,
-            'created': created
+            'completed': completed_by_day.get(date, 0),
+            'created': created_by_day.get(date, 0)
         })
     
-    # Calculate streak
+    # Calculate streak (consecutive days with completions, within the period)
     streak = 0
-    for i in range(days):
-        date = (datetime.now() - timedelta(days=i)).date().isoformat()
-        cursor.execute('''
-            SELECT COUNT(*) as count FROM todos
-            WHERE status = 'completed' AND date(completed_at) = ?
-        ''', (date,))
-        if cursor.fetchone()['count'] > 0:
+    for date in reversed(dates):
+        if completed_by_day.get(date):
             streak += 1
         else:
             break
@@ -1156,80 +1190,58 @@ def get_analytics():
     ''')
     by_category = [dict(row) for row in cursor.fetchall()]
     
-    conn.close()
-    
-    return jsonify({
+    return cached_json({
         'daily_stats': stats,
         'current_streak': streak,
         'best_day': dict(best_day) if best_day else None,
         'by_category': by_category
-    })
+    }, max_age=0)  # refetched right after a task is created: always revalidate
 
 
 # ============== HABITS ==============
 
+# Streaks are materialized on habits by toggle_habit; a streak ending before today is 0
+SQL_HABITS = '''
+    SELECT h.id, h.name, h.emoji, h.frequency, h.target_count, h.color, h.created_at,
+           COALESCE(ht.completed, 0) as today_completed,
+           (SELECT COUNT(*) FROM habit_tracking WHERE habit_id = h.id AND completed = 1) as total_completions,
+           CASE WHEN h.streak_date = ? THEN h.streak ELSE 0 END as streak
+    FROM habits h
+    LEFT JOIN habit_tracking ht ON h.id = ht.habit_id AND ht.date = ?
+    ORDER BY h.created_at
+'''
+
+
 @app.route('/api/habits', methods=['GET'])
 def get_habits():
     """Get all habits with today's status."""
-    conn = get_db()
+    conn = get_conn()
     cursor = conn.cursor()
     today = datetime.now().date().isoformat()
     
-    cursor.execute('''
-        SELECT h.*, 
-               COALESCE(ht.completed, 0) as today_completed,
-               (SELECT COUNT(*) FROM habit_tracking WHERE habit_id = h.id AND completed = 1) as total_completions
-        FROM habits h
-        LEFT JOIN habit_tracking ht ON h.id = ht.habit_id AND ht.date = ?
-        ORDER BY h.created_at
-    ''', (today,))
-    
-    habits = [dict(row) for row in cursor.fetchall()]
-    
-    # Calculate streak for each habit
-    for habit in habits:
-        streak = 0
-        for i in range(30):  # Max 30 days streak check
-            date = (datetime.now() - timedelta(days=i)).date().isoformat()
-            cursor.execute('''
-                SELECT completed FROM habit_tracking
-                WHERE habit_id = ? AND date = ?
-            ''', (habit['id'], date))
-            result = cursor.fetchone()
-            if result and result['completed']:
-                streak += 1
-            else:
-                break
-        habit['streak'] = streak
+    cursor.execute(SQL_HABITS, (today, today))
     
-    conn.close()
-    return jsonify(habits)
+    return json_rows(cursor)
 
 
 @app.route('/api/habits', methods=['POST'])
 def create_habit():
     """Create a new habit."""
     data = request.json
-    conn = get_db()
+    conn = get_conn()
     cursor = conn.cursor()
     
-    cursor.execute('''
-        INSERT INTO habits (name, emoji, frequency, target_count, color)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (
-        data.get('name'),
-        data.get('emoji', '✅'),
-        data.get('frequency', 'daily'),
-        data.get('target_count', 1),
-        data.get('color', '#10b981')
-    ))
-    
-    habit_id = cursor.lastrowid
-    conn.commit()
-    
-    cursor.execute('SELECT * FROM habits WHERE id = ?', (habit_id,))
-    habit = dict(cursor.fetchone())
-    conn.close()
+    with writer(conn):
+        habit = execute_returning(cursor, 'habits', '''
+            INSERT INTO habits (name, emoji, frequency, target_count, color)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (
+            data.get('name'),
+            data.get('emoji', '✅'),
+            data.get('frequency', 'daily'),
+            data.get('target_count', 1),
+            data.get('color', '#10b981')
+        ))
     
     return jsonify(habit), 201
 
@@ -1237,79 +1249,107 @@ def create_habit():
 @app.route('/api/habits/<int:habit_id>', methods=['DELETE'])
 def delete_habit(habit_id):
     """Delete a habit."""
-    conn = get_db()
+    conn = get_conn()
     cursor = conn.cursor()
-    cursor.execute('DELETE FROM habits WHERE id = ?', (habit_id,))
-    conn.commit()
-    conn.close()
+    with writer(conn):
+        cursor.execute('DELETE FROM habits WHERE id = ?', (habit_id,))
     return jsonify({'success': True})
 
 
+SQL_TOGGLE_HABIT = '''
+    INSERT INTO habit_tracking (habit_id, date, completed)
+    VALUES (?, ?, 1)
+    ON CONFLICT(habit_id, date) DO UPDATE SET completed = 1 - completed
+'''
+SQL_TOGGLE_HABIT_RETURNING = SQL_TOGGLE_HABIT + ' RETURNING completed'
+
+
 @app.route('/api/habits/<int:habit_id>/check', methods=['PUT'])
 def toggle_habit(habit_id):
     """Toggle habit completion for today."""
-    conn = get_db()
+    conn = get_conn()
     cursor = conn.cursor()
     today = datetime.now().date().isoformat()
     
-    # Check current status
-    cursor.execute('''
-        SELECT completed FROM habit_tracking
-        WHERE habit_id = ? AND date = ?
-    ''', (habit_id, today))
-    result = cursor.fetchone()
-    
-    if result:
-        new_status = 0 if result['completed'] else 1
-        cursor.execute('''
-            UPDATE habit_tracking SET completed = ?
-            WHERE habit_id = ? AND date = ?
-        ''', (new_status, habit_id, today))
-    else:
-        new_status = 1
-        cursor.execute('''
-            INSERT INTO habit_tracking (habit_id, date, completed)
-            VALUES (?, ?, 1)
-        ''', (habit_id, today))
-    
-    conn.commit()
-    conn.close()
-    
+    try:
+        with writer(conn):
+            # The UNIQUE(habit_id, date) constraint lets SQLite insert or flip in one statement
+            if HAS_RETURNING:
+                cursor.execute(SQL_TOGGLE_HABIT_RETURNING, (habit_id, today))
+            else:
+                cursor.execute(SQL_TOGGLE_HABIT, (habit_id, today))
+                cursor.execute('''
+                    SELECT completed FROM habit_tracking
+                    WHERE habit_id = ? AND date = ?
+                ''', (habit_id, today))
+            new_status = cursor.fetchone()['completed']
+            # Today's row is the only one that can change, so only this habit's streak moves
+            refresh_habit_streaks(conn, today, habit_id)
+    except sqlite3.IntegrityError:
+        # foreign_keys=ON: the tracking row cannot reference a missing habit
+        return jsonify({'error': 'Habit not found'}), 404
+
     return jsonify({'completed': new_status})
 
 
+HABIT_HISTORY_DAYS = 30
+
+# Dense day series LEFT JOINed to the tracking rows: one statement for the whole window
+SQL_HABIT_HISTORY = '''
+    WITH RECURSIVE d(x) AS (
+        SELECT ?
+        UNION ALL
+        SELECT date(x, '+1 day') FROM d WHERE x < ?
+    )
+    SELECT d.x AS date, COALESCE(ht.completed, 0) AS completed
+    FROM d
+    LEFT JOIN habit_tracking ht ON ht.habit_id = ? AND ht.date = d.x
+    ORDER BY d.x
+'''
+
+
 @app.route('/api/habits/<int:habit_id>/history', methods=['GET'])
 def get_habit_history(habit_id):
     """Get habit history for the last 30 days."""
-    conn = get_db()
+    conn = get_conn()
     cursor = conn.cursor()
     
-    history = []
-    for i in range(29, -1, -1):
-        date = (datetime.now() - timedelta(days=i)).date().isoformat()
-        cursor.execute('''
-            SELECT completed FROM habit_tracking
-            WHERE habit_id = ? AND date = ?
-        ''', (habit_id, date))
-        result = cursor.fetchone()
-        history.append({
-            'date': date,
-            'completed': result['completed'] if result else 0
-        })
+    # Local dates from Python: SQLite's date('now') is UTC
+    today = datetime.now().date()
+    start = today - timedelta(days=HABIT_HISTORY_DAYS - 1)
+    cursor.execute(SQL_HABIT_HISTORY, (start.isoformat(), today.isoformat(), habit_id))
     
-    conn.close()
-    return jsonify(history)
+    return json_rows(cursor)
 
 
 # ============== CALENDAR VIEW ==============
 
+# The inner ORDER BY keeps each day's array sorted by deadline
+SQL_CALENDAR_BY_DAY = '''
+    SELECT substr(deadline, 1, 10) AS day,
+           json_group_array(json_object(
+               'id', id, 'title', title, 'priority', priority,
+               'deadline', deadline, 'status', status
+           )) AS tasks
+    FROM (
+        SELECT id, title, priority, deadline, status
+        FROM todos
+        WHERE deadline >= ? AND deadline < ? AND archived = 0
+        ORDER BY deadline
+    )
+    GROUP BY day
+    ORDER BY day
+'''
+
+
 @app.route('/api/calendar', methods=['GET'])
 def get_calendar():
     """Get calendar data for a month."""
-    year = int(request.args.get('year', datetime.now().year))
-    month = int(request.args.get('month', datetime.now().month))
+    now = datetime.now()
+    year = int(request.args.get('year', now.year))
+    month = int(request.args.get('month', now.month))
     
-    conn = get_db()
+    conn = get_conn()
     cursor = conn.cursor()
     
     # Get first and last day of month
@@ -1319,33 +1359,21 @@ def get_calendar():
     else:
         last_day = f"{year}-{month + 1:02d}-01"
     
-    # Tasks with deadlines in this month
-    cursor.execute('''
-        SELECT id, title, priority, deadline, status
-        FROM todos
-        WHERE deadline >= ? AND deadline < ? AND archived = 0
-        ORDER BY deadline
-    ''', (first_day, last_day))
-    
-    tasks = [dict(row) for row in cursor.fetchall()]
-    
-    # Group by day
-    by_day = {}
-    for task in tasks:
-        if task['deadline']:
-            day = task['deadline'][:10]
-            if day not in by_day:
-                by_day[day] = []
-            by_day[day].append(task)
-    
-    conn.close()
-    
-    return jsonify({
-        'year': year,
-        'month': month,
-        'tasks_by_day': by_day
-    })
+    # Tasks with deadlines in this month, already grouped by day as JSON arrays
+    cursor.execute(SQL_CALENDAR_BY_DAY, (first_day, last_day))
+
+    def generate():
+        # SQLite's JSON arrays are spliced in as-is: rows stream out without a decode/encode pass
+        yield b'{"year":%d,"month":%d,"tasks_by_day":{' % (year, month)
+        separator = b''
+        for day, tasks in cursor:
+            yield separator + orjson.dumps(day) + b':' + tasks.encode()
+            separator = b','
+        yield b'}}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
 
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=PORT, debug=True)
+    # Dev server only (DEBUG=1 for the reloader/debugger); production runs gunicorn.conf.py
+    app.run(host='0.0.0.0', port=PORT, debug=DEBUG)
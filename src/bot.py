@@ -5,17 +5,28 @@ Utilise Claude Haiku pour parser les messages naturels
 Optimisé pour minimiser les tokens/coûts
 """
 
+import asyncio
 import os
-import json
 import logging
 import re
+import threading
+import time
+from dataclasses import dataclass, field
 from datetime import datetime
+from functools import lru_cache, wraps
+from urllib.parse import urlsplit
 from dotenv import load_dotenv
 import anthropic
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
 
+from src.db import get_conn
+from src.services.dashboard import SQL_ROADMAP, compute_stats, todos_query
+
 load_dotenv()
 
 # Configuration
@@ -25,33 +36,77 @@ ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY')
 CLAUDE_MODEL = os.getenv('CLAUDE_MODEL', 'claude-haiku-4-5-20251001')
 DASHBOARD_API_URL = os.getenv('DASHBOARD_API_URL', 'http://localhost:5001/api')
 MAX_TOKENS = int(os.getenv('MAX_TOKENS_RESPONSE', 500))
+# Dashboard sur la même machine : lectures directes dans SQLite, sans HTTP (BOT_DIRECT_DB=0 pour désactiver)
+BOT_DIRECT_DB = (os.getenv('BOT_DIRECT_DB', '1') == '1'
+                 and urlsplit(DASHBOARD_API_URL).hostname in ('localhost', '127.0.0.1', '::1'))
 
 # Logging
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Agent assistant (Gmail/Calendar/IA) : import tenté une seule fois au démarrage,
+# les handlers basculent sur leur fallback si indisponible
+try:
+    from src.agents import assistant_agent
+    ASSISTANT_AGENT_ERROR = None
+except Exception as e:
+    assistant_agent = None
+    ASSISTANT_AGENT_ERROR = e
+    logger.warning(f"assistant_agent indisponible: {e}")
+
 # Claude client
 claude = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
 
-# Cache pour réduire les appels API
-command_cache = {}
+# Session HTTP persistante vers le dashboard (keep-alive, pas de handshake par appel)
+DASHBOARD_SESSION = requests.Session()
+_dashboard_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16,
+                                 max_retries=Retry(total=2, backoff_factor=0.2))
+DASHBOARD_SESSION.mount('http://', _dashboard_adapter)
+DASHBOARD_SESSION.mount('https://', _dashboard_adapter)
+
+# Cache LRU des réponses Claude (messages identiques = pas de nouvel appel)
+CLAUDE_CACHE_SIZE = int(os.getenv('CLAUDE_CACHE_SIZE', 2048))
+
+# Durée max d'un appel à l'agent (Gmail, Calendar, Claude) avant d'abandonner la commande
+AGENT_TIMEOUT_SECONDS = float(os.getenv('AGENT_TIMEOUT_SECONDS', 30))
+
+
+@dataclass(slots=True, eq=False)
+class Pending:
+    """Conversation en attente d'une réponse (proposal = tâche ou événement proposé par l'IA)."""
+    original_message: str
+    proposal: dict
+    message_id: int
+    state: str = 'awaiting_response'
+    timestamp: float = field(default_factory=time.monotonic)
+    expiry: asyncio.TimerHandle | None = None
+
 
-# État conversationnel pour /add intelligent (max 2 échanges)
-# Structure: {chat_id: {'task': {...}, 'state': str, 'timestamp': datetime, 'message_id': int}}
+# État conversationnel pour /add intelligent (max 2 échanges) : {chat_id: Pending}
 pending_tasks = {}
 
-# État conversationnel pour création d'événement calendrier
+# État conversationnel pour création d'événement calendrier : {chat_id: Pending}
 pending_events = {}
 
+# Réponses courtes reconnues dans une conversation en attente
+CANCEL_WORDS = frozenset({'annule', 'annuler', 'cancel', 'non', 'stop'})
+CONFIRM_WORDS = frozenset({'ok', 'oui', 'yes', 'valide', 'valider', 'go', '👍'})
+# Mot-clé retiré du message libre : un seul passage, premier mot-clé trouvé dans le texte
+COMPLETE_PREFIX_RE = re.compile('fait |done |terminé |fini |✅ ')
+CONTENT_PREFIX_RE = re.compile('content |tweet |post |linkedin ')
+
+# Une conversation en attente expire après 5 minutes sans réponse
+PENDING_TTL_SECONDS = 300
+
 # =============================================================================
 # OPTIMISATION TOKENS : Prompts système courts et précis
 # =============================================================================
 
-SYSTEM_PROMPT_PARSER = """Tu es un assistant qui parse des messages en JSON pour une todo list.
+SYSTEM_PROMPT_PARSER = """Tu es un assistant qui structure des messages pour une todo list.
 Catégories: easynode, immobilier, content, personnel, admin
 Priorités: urgent, important, normal
 
-Réponds UNIQUEMENT en JSON valide, rien d'autre."""
+Réponds uniquement via l'outil fourni."""
 
 SYSTEM_PROMPT_CONTENT = """Tu crées du contenu pour réseaux sociaux.
 EasyNode = startup IA souveraine française, infrastructure GPU, LLM locaux
@@ -80,7 +135,70 @@ Règles:
 - Le guide doit être concret et actionnable
 - Estime le temps de façon réaliste
 
-Réponds UNIQUEMENT en JSON valide."""
+Réponds uniquement via l'outil fourni."""
+
+
+# =============================================================================
+# SCHÉMAS D'OUTILS : Claude répond en arguments structurés, pas en texte JSON
+# =============================================================================
+
+CATEGORIES = ['easynode', 'immobilier', 'content', 'personnel', 'admin']
+PRIORITIES = ['urgent', 'important', 'normal']
+PRIORITY_EMOJI = {'urgent': '🔴', 'important': '🟠', 'normal': '🟡'}
+DAY_NAMES_FR = ('Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche')
+
+_STR = {'type': 'string'}
+_DEADLINE = {'type': ['string', 'null'], 'description': 'YYYY-MM-DD ou null'}
+_GUIDE = {'type': 'array', 'items': _STR, 'description': '3-5 étapes concrètes'}
+
+
+def _tool(name: str, description: str, properties: dict) -> dict:
+    """Outil dont tous les champs sont requis."""
+    return {
+        'name': name,
+        'description': description,
+        'input_schema': {'type': 'object', 'properties': properties, 'required': list(properties)},
+    }
+
+
+CLAUDE_TOOLS = {tool['name']: tool for tool in (
+    _tool('extract_task', 'Tâche extraite du message.', {
+        'title': _STR,
+        'category': {'enum': CATEGORIES},
+        'priority': {'enum': PRIORITIES},
+        'deadline': _DEADLINE,
+    }),
+    _tool('identify_task', 'Tâche à marquer comme terminée.', {
+        'task_identifier': _STR,
+        'match_type': {'enum': ['id', 'title_partial']},
+    }),
+    _tool('write_posts', 'Posts pour réseaux sociaux.', {
+        'tweet_easynode': {'type': 'string', 'description': 'max 280 chars, technique, hashtags'},
+        'linkedin_souverain': {'type': 'string', 'description': '3-5 phrases, thought leadership, emojis pros'},
+    }),
+    _tool('propose_task', 'Tâche analysée et proposée à Alexandre.', {
+        'title': {'type': 'string', 'description': 'titre reformulé, clair et actionnable'},
+        'category': {'enum': CATEGORIES},
+        'priority': {'enum': PRIORITIES},
+        'time_estimate': {'type': 'string', 'description': 'estimation réaliste (ex: 30min, 1-2h, 3-4h, 1 jour)'},
+        'deadline': _DEADLINE,
+        'guide': _GUIDE,
+        'questions': {'type': 'array', 'items': _STR, 'maxItems': 2},
+        'needs_clarification': {'type': 'boolean'},
+    }),
+    _tool('finalize_task', 'Tâche finale intégrant les réponses.', {
+        'title': _STR,
+        'category': {'enum': CATEGORIES},
+        'priority': {'enum': PRIORITIES},
+        'time_estimate': _STR,
+        'deadline': _DEADLINE,
+        'guide': _GUIDE,
+    }),
+    _tool('classify_task', 'Catégorie et priorité de la tâche.', {
+        'category': {'enum': CATEGORIES},
+        'priority': {'enum': PRIORITIES},
+    }),
+)}
 
 
 # =============================================================================
@@ -91,14 +209,7 @@ def api_call(method: str, endpoint: str, data: dict = None) -> dict:
     """Appel API vers le dashboard."""
     url = f"{DASHBOARD_API_URL}/{endpoint}"
     try:
-        if method == 'GET':
-            response = requests.get(url, timeout=10)
-        elif method == 'POST':
-            response = requests.post(url, json=data, timeout=10)
-        elif method == 'PUT':
-            response = requests.put(url, json=data, timeout=10)
-        elif method == 'DELETE':
-            response = requests.delete(url, timeout=10)
+        response = DASHBOARD_SESSION.request(method, url, json=data, timeout=10)
         return response.json() if response.status_code < 400 else {'error': response.text}
     except Exception as e:
         logger.error(f"API Error: {e}")
@@ -122,8 +233,112 @@ def format_guide_as_description(result: dict) -> str:
     return '\n'.join(parts) if parts else None
 
 
+def guide_markdown(steps: list, label: str = 'Guide') -> str:
+    """Bloc Markdown des 5 premières étapes du guide (chaîne vide sans guide)."""
+    if not steps:
+        return ""
+    return f"\n🧭 **{label}:**\n" + "".join(f"   {i}. {step}\n" for i, step in enumerate(steps[:5], 1))
+
+
+# Cache court des lectures dashboard : {(fonction, args, kwargs): (frais_jusqu'à, périmé_jusqu'à, valeur)}
+_read_cache = {}
+# Un verrou par clé : sur un cache expiré, un seul thread interroge le dashboard, les autres attendent sa valeur
+_read_locks = {}
+
+# Dashboard injoignable : la dernière valeur connue reste servie pendant 10 minutes
+STALE_GRACE_SECONDS = 600
+
+
+def ttl_cache(ttl: float):
+    """
+    Mémorise le résultat d'une lecture pendant `ttl` secondes (les erreurs ne sont jamais gardées).
+    Si l'appel échoue ensuite, la dernière valeur valide est resservie (voir served_stale).
+    Les appels concurrents sur une même clé expirée partagent une seule lecture.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (fn.__name__, args, tuple(sorted(kwargs.items())))
+            hit = _read_cache.get(key)
+            if hit and time.monotonic() < hit[0]:
+                return hit[2]
+            with _read_locks.setdefault(key, threading.Lock()):
+                # Rempli par le thread qui tenait le verrou pendant qu'on attendait
+                now = time.monotonic()
+                hit = _read_cache.get(key)
+                if hit and now < hit[0]:
+                    return hit[2]
+                value = fn(*args, **kwargs)
+                if isinstance(value, dict) and 'error' in value:
+                    if hit and now < hit[1]:
+                        logger.warning(f"{fn.__name__}: dashboard en erreur, valeur en cache servie")
+                        return hit[2]
+                    return value
+                _read_cache[key] = (now + ttl, now + ttl + STALE_GRACE_SECONDS, value)
+                return value
+        return wrapper
+    return decorator
+
+
+STALE_NOTE = "_(données en cache)_"
+
+
+def served_stale(*values) -> bool:
+    """True si l'une des valeurs vient du cache après expiration (fallback sur erreur)."""
+    now = time.monotonic()
+    return any(cached is value and now >= fresh_until
+               for fresh_until, _, cached in list(_read_cache.values()) for value in values)
+
+
+def with_stale_note(msg: str, *values) -> str:
+    """Préfixe le message d'un avertissement quand ses données viennent du fallback."""
+    return f"{STALE_NOTE}\n\n{msg}" if served_stale(*values) else msg
+
+
+# Telegram refuse les messages > 4096 caractères ; marge pour le Markdown
+MESSAGE_CHUNK_SIZE = 4000
+
+
+def split_message(msg: str, limit: int = MESSAGE_CHUNK_SIZE) -> list:
+    """Découpe un message trop long aux fins de ligne pour rester sous la limite Telegram."""
+    chunks = []
+    while len(msg) > limit:
+        cut = msg.rfind('\n', 0, limit)
+        if cut <= 0:
+            cut = limit
+        chunks.append(msg[:cut])
+        msg = msg[cut:].lstrip('\n')
+    chunks.append(msg)
+    return chunks
+
+
+def invalidate_read_cache(*names: str):
+    """Oublie les lectures des fonctions `names` après une écriture du bot (toutes si aucun nom)."""
+    if not names:
+        _read_cache.clear()
+        return
+    # Copie des clés : les lecteurs to_thread insèrent dans le dict en parallèle
+    for key in [key for key in list(_read_cache) if key[0] in names]:
+        _read_cache.pop(key, None)
+
+
+def db_query(sql: str, params: tuple = ()) -> list:
+    """Lecture directe dans la base du dashboard (même format que l'API JSON)."""
+    try:
+        cursor = get_conn().cursor()
+        cursor.execute(sql, params)
+        return [dict(row) for row in cursor.fetchall()]
+    except Exception as e:
+        logger.error(f"DB Error: {e}")
+        return {'error': str(e)}
+
+
+@ttl_cache(10)
 def get_todos(status: str = None) -> list:
     """Récupère les tâches."""
+    if BOT_DIRECT_DB:
+        by_status = bool(status) and status != 'all'
+        return db_query(todos_query(False, None, by_status, False), (status,) if by_status else ())
     endpoint = f"todos?status={status}" if status else "todos"
     return api_call('GET', endpoint)
 
@@ -142,21 +357,37 @@ def create_todo(title: str, category: str = 'easynode', priority: str = 'normal'
         # Add time estimate to description if not already included
         if description and time_estimate not in description:
             data['description'] = f"⏱️ Temps estimé: {time_estimate}\n\n{description}"
-    return api_call('POST', 'todos', data)
+    todo = api_call('POST', 'todos', data)
+    # Une tâche modifiée change la liste et les stats, pas la roadmap
+    invalidate_read_cache('get_todos', 'get_stats')
+    return todo
 
 
 def update_todo(todo_id: int, data: dict) -> dict:
     """Met à jour une tâche."""
-    return api_call('PUT', f'todos/{todo_id}', data)
+    todo = api_call('PUT', f'todos/{todo_id}', data)
+    # Une tâche modifiée change la liste et les stats, pas la roadmap
+    invalidate_read_cache('get_todos', 'get_stats')
+    return todo
 
 
+@ttl_cache(15)
 def get_stats() -> dict:
     """Récupère les statistiques."""
+    if BOT_DIRECT_DB:
+        try:
+            return compute_stats(get_conn().cursor())
+        except Exception as e:
+            logger.error(f"DB Error: {e}")
+            return {'error': str(e)}
     return api_call('GET', 'stats')
 
 
+@ttl_cache(30)
 def get_roadmap() -> list:
     """Récupère la roadmap."""
+    if BOT_DIRECT_DB:
+        return db_query(SQL_ROADMAP)
     return api_call('GET', 'roadmap')
 
 
@@ -164,51 +395,61 @@ def get_roadmap() -> list:
 # PARSING INTELLIGENT AVEC CLAUDE (optimisé tokens)
 # =============================================================================
 
+def normalize_message(message: str) -> str:
+    """Normalise les espaces pour que les variantes d'un même message partagent l'entrée du cache."""
+    return ' '.join(message.split())
+
+
+@lru_cache(maxsize=CLAUDE_CACHE_SIZE)
+def claude_json(system: str, max_tokens: int, tool: str, user_prompt: str) -> bytes:
+    """
+    Appelle Claude en forçant l'outil `tool` et retourne ses arguments sérialisés en JSON.
+    Seules les réponses valides sont mises en cache : une erreur lève une exception.
+    """
+    response = claude.messages.create(
+        model=CLAUDE_MODEL,
+        max_tokens=max_tokens,
+        system=system,
+        tools=[CLAUDE_TOOLS[tool]],
+        tool_choice={'type': 'tool', 'name': tool},
+        messages=[{"role": "user", "content": user_prompt}]
+    )
+
+    for block in response.content:
+        if block.type == 'tool_use':
+            return orjson.dumps(block.input)
+    raise ValueError(f"Claude n'a pas appelé l'outil {tool} (stop_reason={response.stop_reason})")
+
+
 def parse_with_claude(message: str, intent: str) -> dict:
     """
     Parse un message naturel avec Claude Haiku.
     Intent: 'add_task', 'complete_task', 'generate_content'
     """
+    message = normalize_message(message)
 
     if intent == 'add_task':
-        user_prompt = f"""Message: "{message}"
-
-Extrais en JSON:
-{{"title": "...", "category": "easynode|immobilier|content|personnel|admin", "priority": "urgent|important|normal", "deadline": null}}"""
+        tool = 'extract_task'
+        user_prompt = f'Message: "{message}"'
 
     elif intent == 'complete_task':
-        user_prompt = f"""Message: "{message}"
-
-Extrais en JSON:
-{{"task_identifier": "...", "match_type": "id|title_partial"}}"""
+        tool = 'identify_task'
+        user_prompt = f'Message: "{message}"'
 
     elif intent == 'generate_content':
-        user_prompt = f"""Sujet: "{message}"
-
-Génère en JSON:
-{{"tweet_easynode": "max 280 chars, technique, hashtags", "linkedin_souverain": "3-5 phrases, thought leadership, emojis pros"}}"""
+        tool = 'write_posts'
+        user_prompt = f'Sujet: "{message}"'
 
     else:
         return {'error': 'Unknown intent'}
 
     try:
-        response = claude.messages.create(
-            model=CLAUDE_MODEL,
-            max_tokens=MAX_TOKENS,
-            system=SYSTEM_PROMPT_PARSER if intent != 'generate_content' else SYSTEM_PROMPT_CONTENT,
-            messages=[{"role": "user", "content": user_prompt}]
-        )
-
-        # Extraire le JSON de la réponse
-        text = response.content[0].text.strip()
-        # Nettoyer si markdown
-        if text.startswith('```'):
-            text = re.sub(r'```json?\n?', '', text)
-            text = text.replace('```', '')
+        system = SYSTEM_PROMPT_PARSER if intent != 'generate_content' else SYSTEM_PROMPT_CONTENT
+        # Le contenu généré doit varier d'une demande à l'autre : pas de cache
+        call = claude_json.__wrapped__ if intent == 'generate_content' else claude_json
+        return orjson.loads(call(system, MAX_TOKENS, tool, user_prompt))
 
-        return json.loads(text)
-
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         logger.error(f"JSON Parse Error: {e}")
         return {'error': 'Invalid JSON from Claude'}
     except Exception as e:
@@ -221,49 +462,26 @@ def analyze_task_with_claude(message: str) -> dict:
     Analyse une tâche avec Claude pour le mode intelligent.
     Retourne: titre, catégorie, priorité, temps estimé, guide, questions éventuelles.
     """
+    message = normalize_message(message)
     # Inject session context if available
     session_context = ""
-    try:
-        from src.agents.assistant_agent import get_session_context_summary
-        session_context = get_session_context_summary()
-        if session_context:
-            session_context = f"\n\n{session_context}\n"
-    except Exception:
-        pass
+    if assistant_agent is not None:
+        try:
+            session_context = assistant_agent.get_session_context_summary()
+            if session_context:
+                session_context = f"\n\n{session_context}\n"
+        except Exception:
+            pass
 
     user_prompt = f"""Analyse cette demande de tâche: "{message}"{session_context}
 
-Réponds en JSON:
-{{
-    "title": "titre reformulé, clair et actionnable",
-    "category": "easynode|immobilier|content|personnel|admin",
-    "priority": "urgent|important|normal",
-    "time_estimate": "estimation réaliste (ex: 30min, 1-2h, 3-4h, 1 jour)",
-    "deadline": null,
-    "guide": ["étape 1 concrète", "étape 2 concrète", "étape 3 concrète"],
-    "questions": [],
-    "needs_clarification": false
-}}
-
 Si la tâche est vague ou manque d'infos importantes, mets needs_clarification à true et ajoute 1-2 questions ciblées dans "questions".
 Sinon, laisse questions vide et needs_clarification à false."""
 
     try:
-        response = claude.messages.create(
-            model=CLAUDE_MODEL,
-            max_tokens=800,
-            system=SYSTEM_PROMPT_TASK_ASSISTANT,
-            messages=[{"role": "user", "content": user_prompt}]
-        )
-
-        text = response.content[0].text.strip()
-        if text.startswith('```'):
-            text = re.sub(r'```json?\n?', '', text)
-            text = text.replace('```', '')
+        return orjson.loads(claude_json(SYSTEM_PROMPT_TASK_ASSISTANT, 800, 'propose_task', user_prompt))
 
-        return json.loads(text)
-
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         logger.error(f"JSON Parse Error in analyze_task: {e}")
         return {'error': 'Invalid JSON from Claude'}
     except Exception as e:
@@ -285,32 +503,12 @@ Questions posées: {original_task.get('questions', [])}
 
 Réponse de l'utilisateur: "{user_response}"
 
-Intègre les réponses et finalise en JSON:
-{{
-    "title": "titre final",
-    "category": "easynode|immobilier|content|personnel|admin",
-    "priority": "urgent|important|normal",
-    "time_estimate": "temps final",
-    "deadline": "YYYY-MM-DD ou null",
-    "guide": ["étape 1", "étape 2", "étape 3"]
-}}"""
+Intègre les réponses et finalise la tâche."""
 
     try:
-        response = claude.messages.create(
-            model=CLAUDE_MODEL,
-            max_tokens=500,
-            system=SYSTEM_PROMPT_TASK_ASSISTANT,
-            messages=[{"role": "user", "content": user_prompt}]
-        )
-
-        text = response.content[0].text.strip()
-        if text.startswith('```'):
-            text = re.sub(r'```json?\n?', '', text)
-            text = text.replace('```', '')
+        return orjson.loads(claude_json(SYSTEM_PROMPT_TASK_ASSISTANT, 500, 'finalize_task', user_prompt))
 
-        return json.loads(text)
-
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         logger.error(f"JSON Parse Error in finalize_task: {e}")
         return {'error': 'Invalid JSON from Claude'}
     except Exception as e:
@@ -318,15 +516,10 @@ Intègre les réponses et finalise en JSON:
         return {'error': str(e)}
 
 
-def detect_intent(message: str) -> str:
-    """
-    Détecte l'intention SANS appeler Claude (économie de tokens).
-    Utilise des patterns simples.
-    """
-    message_lower = message.lower()
-
-    # Patterns pour briefing quotidien (priorité haute)
-    briefing_patterns = [
+# Intentions par ordre de priorité : la première qui matche gagne
+INTENT_PATTERNS = (
+    # Briefing quotidien (priorité haute)
+    ('daily_briefing', (
         "qu'est-ce que je dois faire",
         "quoi faire",
         "que dois-je faire",
@@ -336,95 +529,95 @@ def detect_intent(message: str) -> str:
         "mon planning",
         "mes priorités",
         "par quoi commencer"
-    ]
-    if any(p in message_lower for p in briefing_patterns):
-        return 'daily_briefing'
-
-    # Patterns pour checker les emails
-    email_patterns = ['email', 'mail', 'mails', 'emails', 'inbox', 'messagerie']
-    if any(p in message_lower for p in email_patterns):
-        return 'check_emails'
-
-    # Patterns pour créer un événement calendrier
-    event_patterns = [
+    )),
+    # Checker les emails
+    ('check_emails', ('email', 'mail', 'mails', 'emails', 'inbox', 'messagerie')),
+    # Créer un événement calendrier
+    ('create_event', (
         'calendrier', 'agenda', 'event', 'événement', 'evenement',
         'meeting', 'rdv', 'rendez-vous', 'rendez vous', 'planifie', 'programme'
-    ]
-    if any(p in message_lower for p in event_patterns):
-        return 'create_event'
-
-    # Patterns pour ajouter une tâche
-    add_patterns = ['ajoute', 'add', 'nouvelle', 'créer', 'crée', 'faire', 'todo', 'tâche']
-    if any(p in message_lower for p in add_patterns):
-        return 'add_task'
-
-    # Patterns pour terminer une tâche
-    done_patterns = ['done', 'fait', 'terminé', 'fini', 'complete', 'check', '✓', '✅']
-    if any(p in message_lower for p in done_patterns):
-        return 'complete_task'
-
-    # Patterns pour générer du contenu
-    content_patterns = ['content', 'tweet', 'post', 'linkedin', 'publie', 'écris']
-    if any(p in message_lower for p in content_patterns):
-        return 'generate_content'
-
-    # Patterns pour lister
-    list_patterns = ['list', 'liste', 'show', 'affiche']
-    if any(p in message_lower for p in list_patterns):
-        return 'list_tasks'
-
-    # Patterns pour stats/résumé
-    stats_patterns = ['stats', 'résumé', 'summary', 'progression', 'combien']
-    if any(p in message_lower for p in stats_patterns):
-        return 'show_stats'
-
-    # Patterns pour focus/pomodoro
-    focus_patterns = ['focus', 'pomodoro', 'concentre', 'timer', 'minuteur']
-    if any(p in message_lower for p in focus_patterns):
-        return 'focus'
-
-    # Patterns pour review/bilan
-    review_patterns = ['review', 'revue', 'bilan', 'semaine']
-    if any(p in message_lower for p in review_patterns):
-        return 'weekly_review'
+    )),
+    # Ajouter une tâche
+    ('add_task', ('ajoute', 'add', 'nouvelle', 'créer', 'crée', 'faire', 'todo', 'tâche')),
+    # Terminer une tâche
+    ('complete_task', ('done', 'fait', 'terminé', 'fini', 'complete', 'check', '✓', '✅')),
+    # Générer du contenu
+    ('generate_content', ('content', 'tweet', 'post', 'linkedin', 'publie', 'écris')),
+    # Lister
+    ('list_tasks', ('list', 'liste', 'show', 'affiche')),
+    # Stats/résumé
+    ('show_stats', ('stats', 'résumé', 'summary', 'progression', 'combien')),
+    # Focus/pomodoro
+    ('focus', ('focus', 'pomodoro', 'concentre', 'timer', 'minuteur')),
+    # Review/bilan
+    ('weekly_review', ('review', 'revue', 'bilan', 'semaine')),
+)
+
+# Une regex compilée par intention (alternation de sous-chaînes littérales)
+INTENT_REGEXES = tuple(
+    (intent, re.compile('|'.join(map(re.escape, patterns))))
+    for intent, patterns in INTENT_PATTERNS
+)
+
+
+def detect_intent(message: str) -> str:
+    """
+    Détecte l'intention SANS appeler Claude (économie de tokens).
+    Utilise des patterns simples.
+    """
+    message_lower = message.lower()
+
+    for intent, regex in INTENT_REGEXES:
+        if regex.search(message_lower):
+            return intent
 
     # Par défaut, on considère que c'est une nouvelle tâche
     return 'add_task'
 
 
+async def run_agent(fn, *args, **kwargs):
+    """Exécute un appel bloquant de l'agent dans un thread, sans bloquer la boucle du bot."""
+    try:
+        return await asyncio.wait_for(asyncio.to_thread(fn, *args, **kwargs), AGENT_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:  # alias of TimeoutError only since Python 3.11
+        raise TimeoutError(f"pas de réponse après {AGENT_TIMEOUT_SECONDS:g}s") from None
+
+
 # =============================================================================
 # HANDLERS TELEGRAM
 # =============================================================================
 
+START_MSG = (
+    "👋 Salut Alexandre!\n\n"
+    "Je suis ton assistant personnel. Voici ce que je peux faire:\n\n"
+    "🌅 **Briefing quotidien:**\n"
+    "`Qu'est-ce que je dois faire ?` ou `/briefing`\n\n"
+    "📬 **Emails:**\n"
+    "`Mes emails` ou `/emails`\n\n"
+    "🗓️ **Calendrier:**\n"
+    "`Planifie un meeting demain 10h` ou `/event Démo client jeudi 14h`\n\n"
+    "📝 **Ajouter une tâche:**\n"
+    "`ajoute finir le script urgent easynode`\n\n"
+    "✅ **Terminer une tâche:**\n"
+    "`fait script LLM` ou `/done 1`\n\n"
+    "📋 **Voir les tâches:**\n"
+    "`/list` ou `liste`\n\n"
+    "🗺️ **Roadmap:**\n"
+    "`/roadmap`\n\n"
+    "✍️ **Générer du contenu:**\n"
+    "`/content IA souveraine`\n\n"
+    "💡 Écris-moi naturellement!"
+)
+
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler /start"""
-    await update.message.reply_text(
-        "👋 Salut Alexandre!\n\n"
-        "Je suis ton assistant personnel. Voici ce que je peux faire:\n\n"
-        "🌅 **Briefing quotidien:**\n"
-        "`Qu'est-ce que je dois faire ?` ou `/briefing`\n\n"
-        "📬 **Emails:**\n"
-        "`Mes emails` ou `/emails`\n\n"
-        "🗓️ **Calendrier:**\n"
-        "`Planifie un meeting demain 10h` ou `/event Démo client jeudi 14h`\n\n"
-        "📝 **Ajouter une tâche:**\n"
-        "`ajoute finir le script urgent easynode`\n\n"
-        "✅ **Terminer une tâche:**\n"
-        "`fait script LLM` ou `/done 1`\n\n"
-        "📋 **Voir les tâches:**\n"
-        "`/list` ou `liste`\n\n"
-        "🗺️ **Roadmap:**\n"
-        "`/roadmap`\n\n"
-        "✍️ **Générer du contenu:**\n"
-        "`/content IA souveraine`\n\n"
-        "💡 Écris-moi naturellement!",
-        parse_mode='Markdown'
-    )
+    await update.message.reply_text(START_MSG, parse_mode='Markdown')
 
 
 async def cmd_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler /list - Liste les tâches en attente"""
-    todos = get_todos(status='pending')
+    todos = await asyncio.to_thread(get_todos, 'pending')
 
     if not todos or 'error' in todos:
         await update.message.reply_text("❌ Erreur de connexion au dashboard")
@@ -434,36 +627,32 @@ async def cmd_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("🎉 Aucune tâche en attente!")
         return
 
-    # Grouper par priorité
-    urgent = [t for t in todos if t['priority'] == 'urgent']
-    important = [t for t in todos if t['priority'] == 'important']
-    normal = [t for t in todos if t['priority'] == 'normal']
+    # Grouper par priorité en un seul passage (priorité inconnue = normal)
+    buckets = {'urgent': [], 'important': [], 'normal': []}
+    for t in todos:
+        buckets.get(t['priority'], buckets['normal']).append(t)
 
-    msg = "📋 **Tâches en cours:**\n\n"
+    # Lignes accumulées dans une liste, jointes une seule fois
+    parts = ["📋 **Tâches en cours:**", ""]
 
-    if urgent:
-        msg += "🔴 **URGENT:**\n"
-        for t in urgent:
-            msg += f"  • {t['title']} ({t['category']})\n"
-        msg += "\n"
+    for header, bucket in (("🔴 **URGENT:**", buckets['urgent']), ("🟠 **IMPORTANT:**", buckets['important']),
+                           ("🟡 **NORMAL:**", buckets['normal'])):
+        if bucket:
+            parts.append(header)
+            parts.extend(f"  • {t['title']} ({t['category']})" for t in bucket)
+            parts.append("")
 
-    if important:
-        msg += "🟠 **IMPORTANT:**\n"
-        for t in important:
-            msg += f"  • {t['title']} ({t['category']})\n"
-        msg += "\n"
+    for chunk in split_message(with_stale_note("\n".join(parts), todos)):
+        await update.message.reply_text(chunk, parse_mode='Markdown')
 
-    if normal:
-        msg += "🟡 **NORMAL:**\n"
-        for t in normal:
-            msg += f"  • {t['title']} ({t['category']})\n"
 
-    await update.message.reply_text(msg, parse_mode='Markdown')
+# Barres de progression 0-100% par tranche de 10, construites une fois
+PROGRESS_BARS = tuple('🟩' * i + '⬜' * (10 - i) for i in range(11))
 
 
 async def cmd_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler /stats - Affiche les statistiques"""
-    stats = get_stats()
+    stats = await asyncio.to_thread(get_stats)
 
     if 'error' in stats:
         await update.message.reply_text("❌ Erreur de connexion au dashboard")
@@ -478,14 +667,17 @@ async def cmd_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
 📅 Aujourd'hui: **{stats['today_completed']}** terminées
 
 **Progression: {stats['completion_rate']}%**
-{'🟩' * int(stats['completion_rate'] / 10)}{'⬜' * (10 - int(stats['completion_rate'] / 10))}"""
+{PROGRESS_BARS[min(10, int(stats['completion_rate']) // 10)]}"""
+
+    await update.message.reply_text(with_stale_note(msg, stats), parse_mode='Markdown')
 
-    await update.message.reply_text(msg, parse_mode='Markdown')
+
+ROADMAP_STATUS_EMOJI = {'in_progress': '🔄', 'completed': '✅', 'not_started': '⏳'}
 
 
 async def cmd_roadmap(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler /roadmap - Affiche la roadmap"""
-    items = get_roadmap()
+    items = await asyncio.to_thread(get_roadmap)
 
     if not items or 'error' in items:
         await update.message.reply_text("❌ Erreur de connexion au dashboard")
@@ -499,29 +691,22 @@ async def cmd_roadmap(update: Update, context: ContextTypes.DEFAULT_TYPE):
     mid_term = [i for i in items if i['type'] == 'mid_term']
     long_term = [i for i in items if i['type'] == 'long_term']
 
-    msg = "🗺️ **Roadmap:**\n\n"
-
-    if mid_term:
-        msg += "📅 **Mi-terme (3-6 mois):**\n"
-        for i in mid_term:
-            status = {'in_progress': '🔄', 'completed': '✅', 'not_started': '⏳'}.get(i['status'], '➖')
-            target = f" (date: {i['target_date']})" if i['target_date'] else ""
-            msg += f"  {status} {i['title']}{target}\n"
-        msg += "\n"
+    parts = ["🗺️ **Roadmap:**", ""]
 
-    if long_term:
-        msg += "🎯 **Long-terme (6+ mois):**\n"
-        for i in long_term:
-            status = {'in_progress': '🔄', 'completed': '✅', 'not_started': '⏳'}.get(i['status'], '➖')
-            target = f" (date: {i['target_date']})" if i['target_date'] else ""
-            msg += f"  {status} {i['title']}{target}\n"
+    for header, bucket in (("📅 **Mi-terme (3-6 mois):**", mid_term), ("🎯 **Long-terme (6+ mois):**", long_term)):
+        if bucket:
+            parts.append(header)
+            for i in bucket:
+                status = ROADMAP_STATUS_EMOJI.get(i['status'], '➖')
+                target = f" (date: {i['target_date']})" if i['target_date'] else ""
+                parts.append(f"  {status} {i['title']}{target}")
+            parts.append("")
 
-    await update.message.reply_text(msg, parse_mode='Markdown')
+    for chunk in split_message(with_stale_note("\n".join(parts), items)):
+        await update.message.reply_text(chunk, parse_mode='Markdown')
 
 
-async def cmd_help(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handler /help - Affiche toutes les commandes disponibles"""
-    msg = """📚 **Commandes disponibles:**
+HELP_MSG = """📚 **Commandes disponibles:**
 
 🌅 **Briefing & Emails**
 • `/briefing` - Briefing quotidien complet
@@ -554,17 +739,18 @@ async def cmd_help(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 💡 **Astuce:** Tu peux aussi m'écrire naturellement!
 _Exemples: "ajoute une tâche urgente pour finir le script", "qu'est-ce que je dois faire aujourd'hui?"_"""
-    
-    await update.message.reply_text(msg, parse_mode='Markdown')
 
 
-async def cmd_site(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handler /site - Affiche le lien du dashboard"""
-    dashboard_url = os.getenv('DASHBOARD_PUBLIC_URL', DASHBOARD_API_URL.replace('/api', ''))
-    
-    msg = f"""🌐 **Dashboard Todo**
+async def cmd_help(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler /help - Affiche toutes les commandes disponibles"""
+    await update.message.reply_text(HELP_MSG, parse_mode='Markdown')
 
-🔗 **Lien:** {dashboard_url}
+
+DASHBOARD_PUBLIC_URL = os.getenv('DASHBOARD_PUBLIC_URL', DASHBOARD_API_URL.replace('/api', ''))
+
+SITE_MSG = f"""🌐 **Dashboard Todo**
+
+🔗 **Lien:** {DASHBOARD_PUBLIC_URL}
 
 📊 Accède à ton dashboard pour:
 • Visualiser toutes tes tâches
@@ -573,8 +759,11 @@ async def cmd_site(update: Update, context: ContextTypes.DEFAULT_TYPE):
 • Consulter le contenu quotidien
 
 💡 _Utilise /stats pour un aperçu rapide ici._"""
-    
-    await update.message.reply_text(msg, parse_mode='Markdown')
+
+
+async def cmd_site(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler /site - Affiche le lien du dashboard"""
+    await update.message.reply_text(SITE_MSG, parse_mode='Markdown')
 
 
 async def cmd_content(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -647,27 +836,35 @@ async def cmd_briefing(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler /briefing - Briefing quotidien complet"""
     await update.message.reply_text("🔄 Génération du briefing...", parse_mode='Markdown')
 
+    if assistant_agent is None:
+        # Fallback sans assistant_agent
+        await process_simple_briefing(update)
+        return
+
     try:
-        # Import dynamique pour éviter les erreurs si Gmail pas configuré
-        from src.agents.assistant_agent import what_should_i_do, suggest_daily_priorities
-        briefing = what_should_i_do()
+        # Briefing et priorités IA sont indépendants : en parallèle, chacun dans un thread
+        briefing, priorities = await asyncio.gather(
+            run_agent(assistant_agent.what_should_i_do),
+            run_agent(assistant_agent.suggest_daily_priorities),
+            return_exceptions=True
+        )
+        if isinstance(briefing, Exception):
+            raise briefing
 
         # Append AI priorities
         try:
-            priorities = suggest_daily_priorities()
+            if isinstance(priorities, Exception):
+                raise priorities
             if priorities.get('priorities'):
-                briefing += "\n\n🤖 **Ordre suggéré par l'IA:**\n"
-                for i, p in enumerate(priorities['priorities'][:5], 1):
-                    briefing += f"  {i}. {p.get('title', '?')}\n"
+                parts = [briefing, "", "🤖 **Ordre suggéré par l'IA:**"]
+                parts.extend(f"  {i}. {p.get('title', '?')}" for i, p in enumerate(priorities['priorities'][:5], 1))
                 if priorities.get('summary'):
-                    briefing += f"\n_{priorities['summary']}_"
+                    parts += ["", f"_{priorities['summary']}_"]
+                briefing = "\n".join(parts)
         except Exception:
             pass
 
         await update.message.reply_text(briefing, parse_mode='Markdown')
-    except ImportError:
-        # Fallback sans assistant_agent
-        await process_simple_briefing(update)
     except Exception as e:
         logger.error(f"Briefing error: {e}")
         await process_simple_briefing(update)
@@ -677,11 +874,7 @@ async def cmd_emails(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler /emails - Résumé des emails"""
     await update.message.reply_text("📬 Vérification des emails...", parse_mode='Markdown')
 
-    try:
-        from src.agents.assistant_agent import check_emails_summary
-        summary = check_emails_summary()
-        await update.message.reply_text(summary, parse_mode='Markdown')
-    except ImportError:
+    if assistant_agent is None:
         await update.message.reply_text(
             "❌ Gmail non configuré.\n\n"
             "Pour configurer:\n"
@@ -689,6 +882,11 @@ async def cmd_emails(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "2. Lance `python assistant_agent.py setup-gmail`",
             parse_mode='Markdown'
         )
+        return
+
+    try:
+        summary = await run_agent(assistant_agent.check_emails_summary)
+        await update.message.reply_text(summary, parse_mode='Markdown')
     except Exception as e:
         await update.message.reply_text(f"❌ Erreur: {str(e)}")
 
@@ -706,16 +904,30 @@ async def cmd_event(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await process_create_event(update, message)
 
 
+async def focus_end(context: ContextTypes.DEFAULT_TYPE):
+    """Job de fin de session /focus (tâche et durée dans job.data)."""
+    context.chat_data.pop('focus_job', None)
+    task_name, duration = context.job.data['task'], context.job.data['duration']
+    await context.bot.send_message(
+        chat_id=context.job.chat_id,
+        text=f"🔔 **Fin de session Focus!**\n\n"
+             f"📝 Tâche: **{task_name}**\n"
+             f"⏱️ {duration} minutes écoulées\n\n"
+             f"☕ Prends une pause de 5 min!\n"
+             f"_Utilise `/done {task_name[:20]}` si tu as terminé._",
+        parse_mode='Markdown'
+    )
+
+
 async def cmd_focus(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler /focus - Start a 25-min Pomodoro focus session."""
     args = context.args if context.args else []
 
     if args and args[0].lower() == 'stop':
-        # Stop any running focus timer
-        jobs = context.job_queue.get_jobs_by_name(f'focus_{update.effective_chat.id}')
-        if jobs:
-            for job in jobs:
-                job.schedule_removal()
+        # Stop the running focus timer (handle kept in chat_data, no job queue scan)
+        job = context.chat_data.pop('focus_job', None)
+        if job:
+            job.schedule_removal()
             await update.message.reply_text("⏹️ Session focus annulée.", parse_mode='Markdown')
         else:
             await update.message.reply_text("❌ Aucune session focus en cours.", parse_mode='Markdown')
@@ -724,14 +936,14 @@ async def cmd_focus(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Get AI priorities to pick the top task
     task_name = "tâche prioritaire"
     try:
-        from src.agents.assistant_agent import suggest_daily_priorities
-        priorities = suggest_daily_priorities()
+        # assistant_agent indisponible (None) = même fallback qu'une erreur IA
+        priorities = await run_agent(assistant_agent.suggest_daily_priorities)
         if priorities.get('priorities'):
             top = priorities['priorities'][0]
             task_name = top.get('title', task_name)
     except Exception:
         # Fallback: get first pending task
-        todos = get_todos(status='pending')
+        todos = await asyncio.to_thread(get_todos, 'pending')
         if todos and isinstance(todos, list) and len(todos) > 0:
             task_name = todos[0].get('title', task_name)
 
@@ -746,23 +958,17 @@ async def cmd_focus(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode='Markdown'
     )
 
-    # Schedule notification
-    async def focus_end(context: ContextTypes.DEFAULT_TYPE):
-        await context.bot.send_message(
-            chat_id=context.job.chat_id,
-            text=f"🔔 **Fin de session Focus!**\n\n"
-                 f"📝 Tâche: **{task_name}**\n"
-                 f"⏱️ {duration} minutes écoulées\n\n"
-                 f"☕ Prends une pause de 5 min!\n"
-                 f"_Utilise `/done {task_name[:20]}` si tu as terminé._",
-            parse_mode='Markdown'
-        )
+    # One focus session per chat: a new /focus replaces the previous timer
+    previous = context.chat_data.pop('focus_job', None)
+    if previous:
+        previous.schedule_removal()
 
-    context.job_queue.run_once(
+    context.chat_data['focus_job'] = context.job_queue.run_once(
         focus_end,
         when=duration * 60,
         chat_id=update.effective_chat.id,
-        name=f'focus_{update.effective_chat.id}'
+        name=f'focus_{update.effective_chat.id}',
+        data={'task': task_name, 'duration': duration}
     )
 
 
@@ -770,9 +976,12 @@ async def cmd_review(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler /review - Weekly review."""
     await update.message.reply_text("📊 Génération du bilan hebdomadaire...", parse_mode='Markdown')
 
+    if assistant_agent is None:
+        await update.message.reply_text(f"❌ Erreur: {ASSISTANT_AGENT_ERROR}")
+        return
+
     try:
-        from src.agents.assistant_agent import generate_weekly_review
-        result = generate_weekly_review()
+        result = await run_agent(assistant_agent.generate_weekly_review)
         review = result.get('review', 'Bilan non disponible.')
         stats = result.get('stats', {})
 
@@ -790,60 +999,84 @@ async def cmd_review(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def process_simple_briefing(update: Update):
     """Briefing simple sans Gmail (fallback)."""
-    todos = get_todos(status='pending')
-    stats = get_stats()
+    # Deux appels dashboard indépendants : en parallèle
+    todos, stats = await asyncio.gather(
+        asyncio.to_thread(get_todos, 'pending'),
+        asyncio.to_thread(get_stats)
+    )
 
     now = datetime.now()
-    day_names = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
-    day_name = day_names[now.weekday()]
+    day_name = DAY_NAMES_FR[now.weekday()]
 
-    msg = f"☀️ **Bonjour Alexandre!**\n\n"
-    msg += f"📅 {day_name} {now.strftime('%d/%m/%Y')}\n\n"
+    parts = ["☀️ **Bonjour Alexandre!**", "", f"📅 {day_name} {now.strftime('%d/%m/%Y')}", ""]
 
-    if todos and not isinstance(todos, dict):
-        urgent = [t for t in todos if t.get('priority') == 'urgent']
-        important = [t for t in todos if t.get('priority') == 'important']
+    if isinstance(todos, list) and todos:
+        parts.append("**🎯 Priorités du jour:**")
+        # Un seul passage, arrêté dès 3 urgentes ; au plus 3 de chaque sont gardées
+        urgent, important = [], []
+        for t in todos:
+            priority = t.get('priority')
+            if priority == 'urgent':
+                urgent.append(t)
+                if len(urgent) == 3:
+                    break
+            elif priority == 'important' and len(important) < 3:
+                important.append(t)
 
-        msg += "**🎯 Priorités du jour:**\n"
-        for t in (urgent + important)[:3]:
-            emoji = '🔴' if t.get('priority') == 'urgent' else '🟠'
-            msg += f"{emoji} {t['title']}\n"
+        parts.extend(f"{PRIORITY_EMOJI[t['priority']]} {t['title']}" for t in (urgent + important)[:3])
 
         if len(todos) > 3:
-            msg += f"\n_...et {len(todos) - 3} autres tâches_\n"
+            parts += ["", f"_...et {len(todos) - 3} autres tâches_"]
 
-    if stats and not isinstance(stats, dict) or (isinstance(stats, dict) and 'error' not in stats):
-        msg += f"\n📊 {stats.get('pending', 0)} tâches en attente"
+    if isinstance(stats, dict) and 'error' not in stats:
+        line = f"📊 {stats.get('pending', 0)} tâches en attente"
         if stats.get('overdue', 0) > 0:
-            msg += f" | ⚠️ {stats['overdue']} en retard"
+            line += f" | ⚠️ {stats['overdue']} en retard"
+        parts += ["", line]
 
-    msg += "\n\n💪 Bonne journée!"
+    parts += ["", "💪 Bonne journée!"]
 
-    await update.message.reply_text(msg, parse_mode='Markdown')
+    await update.message.reply_text(with_stale_note("\n".join(parts), todos, stats), parse_mode='Markdown')
 
 
 # =============================================================================
 # TRAITEMENT DES MESSAGES NATURELS
 # =============================================================================
 
-def clean_expired_pending_tasks():
-    """Nettoie les tâches en attente expirées (> 5 minutes)."""
-    now = datetime.now()
-    expired = [
-        chat_id for chat_id, task in pending_tasks.items()
-        if (now - task['timestamp']).total_seconds() > 300  # 5 minutes
-    ]
-    for chat_id in expired:
-        del pending_tasks[chat_id]
-        logger.info(f"Expired pending task for chat {chat_id}")
-
-    expired_events = [
-        chat_id for chat_id, event in pending_events.items()
-        if (now - event['timestamp']).total_seconds() > 300
-    ]
-    for chat_id in expired_events:
-        del pending_events[chat_id]
-        logger.info(f"Expired pending event for chat {chat_id}")
+def set_pending(kind: str, chat_id: int, entry: Pending):
+    """
+    Enregistre une conversation en attente ('task' ou 'event').
+    Son expiration est un timer de la boucle asyncio : aucun balayage à chaque message.
+    """
+    store = pending_tasks if kind == 'task' else pending_events
+    previous = store.get(chat_id)
+    if previous:
+        previous.expiry.cancel()
+    entry.expiry = asyncio.get_running_loop().call_later(
+        PENDING_TTL_SECONDS, expire_pending, kind, chat_id, entry
+    )
+    store[chat_id] = entry
+
+
+def take_pending(kind: str, chat_id: int) -> Pending | None:
+    """
+    Retire la conversation en attente et annule son timer, avant tout await :
+    l'expiration ne peut plus la supprimer pendant qu'on traite la réponse.
+    """
+    store = pending_tasks if kind == 'task' else pending_events
+    entry = store.pop(chat_id, None)
+    if entry is not None and entry.expiry is not None:
+        entry.expiry.cancel()
+    return entry
+
+
+def expire_pending(kind: str, chat_id: int, entry: Pending):
+    """Timer d'expiration : retire l'entrée si elle est toujours celle en attente."""
+    store = pending_tasks if kind == 'task' else pending_events
+    # Déjà traitée ou remplacée par une plus récente : rien à faire
+    if store.get(chat_id) is entry:
+        del store[chat_id]
+        logger.info(f"Expired pending {kind} for chat {chat_id}")
 
 
 async def process_smart_add_task(update: Update, message: str):
@@ -853,39 +1086,26 @@ async def process_smart_add_task(update: Update, message: str):
     """
     chat_id = update.effective_chat.id
     
-    # Nettoyer les tâches expirées
-    clean_expired_pending_tasks()
-    
-    await update.message.reply_text("🤖 Analyse de ta tâche...", parse_mode='Markdown')
-    
-    # Analyser avec Claude
-    result = analyze_task_with_claude(message)
+    # Analyser avec Claude (dans un thread) pendant l'envoi de l'accusé de réception
+    _, result = await asyncio.gather(
+        update.message.reply_text("🤖 Analyse de ta tâche...", parse_mode='Markdown'),
+        asyncio.to_thread(analyze_task_with_claude, message)
+    )
     
     if 'error' in result:
         await update.message.reply_text(f"❌ Erreur: {result['error']}")
         return
     
-    priority_emoji = {'urgent': '🔴', 'important': '🟠', 'normal': '🟡'}.get(result.get('priority', 'normal'), '⚪')
+    priority_emoji = PRIORITY_EMOJI.get(result.get('priority', 'normal'), '⚪')
     
-    # Construire le guide de réalisation
-    guide_text = ""
-    if result.get('guide'):
-        guide_text = "\n🧭 **Guide de réalisation:**\n"
-        for i, step in enumerate(result['guide'][:5], 1):
-            guide_text += f"   {i}. {step}\n"
+    guide_text = guide_markdown(result.get('guide'), 'Guide de réalisation')
     
     # Vérifier si des questions sont nécessaires
     needs_questions = result.get('needs_clarification', False) and result.get('questions')
     
     if needs_questions:
         # Stocker l'état pour le prochain message
-        pending_tasks[chat_id] = {
-            'original_message': message,
-            'proposed_task': result,
-            'state': 'awaiting_response',
-            'timestamp': datetime.now(),
-            'message_id': update.message.message_id
-        }
+        set_pending('task', chat_id, Pending(message, result, update.message.message_id))
         
         # Message avec questions
         questions_text = "\n❓ **Questions:**\n"
@@ -913,8 +1133,8 @@ async def process_smart_add_task(update: Update, message: str):
         deadline_hint = ""
         if not deadline:
             try:
-                from src.agents.assistant_agent import suggest_deadline
-                suggestion = suggest_deadline(
+                suggestion = await run_agent(
+                    assistant_agent.suggest_deadline,
                     category=result.get('category', 'easynode'),
                     title=result.get('title', message)
                 )
@@ -925,7 +1145,8 @@ async def process_smart_add_task(update: Update, message: str):
                 pass
 
         description = format_guide_as_description(result)
-        todo = create_todo(
+        todo = await asyncio.to_thread(
+            create_todo,
             title=result.get('title', message),
             category=result.get('category', 'easynode'),
             priority=result.get('priority', 'normal'),
@@ -956,28 +1177,24 @@ async def handle_pending_task_response(update: Update, message: str) -> bool:
     """
     chat_id = update.effective_chat.id
     
-    # Nettoyer les tâches expirées
-    clean_expired_pending_tasks()
-    
-    # Vérifier s'il y a une tâche en attente
-    if chat_id not in pending_tasks:
+    # Vérifier s'il y a une tâche en attente (consommée par cette réponse)
+    pending = take_pending('task', chat_id)
+    if pending is None:
         return False
     
-    pending = pending_tasks[chat_id]
-    
     # Vérifier si c'est une annulation
-    if message.lower().strip() in ['annule', 'annuler', 'cancel', 'non', 'stop']:
-        del pending_tasks[chat_id]
+    if message.lower().strip() in CANCEL_WORDS:
         await update.message.reply_text("❌ Tâche annulée.", parse_mode='Markdown')
         return True
     
     # Vérifier si c'est une validation directe
-    if message.lower().strip() in ['ok', 'oui', 'yes', 'valide', 'valider', 'go', '👍']:
+    if message.lower().strip() in CONFIRM_WORDS:
         # Créer la tâche avec les valeurs proposées
-        result = pending['proposed_task']
+        result = pending.proposal
         description = format_guide_as_description(result)
-        todo = create_todo(
-            title=result.get('title', pending['original_message']),
+        todo = await asyncio.to_thread(
+            create_todo,
+            title=result.get('title', pending.original_message),
             category=result.get('category', 'easynode'),
             priority=result.get('priority', 'normal'),
             deadline=result.get('deadline'),
@@ -985,19 +1202,13 @@ async def handle_pending_task_response(update: Update, message: str) -> bool:
             time_estimate=result.get('time_estimate')
         )
         
-        del pending_tasks[chat_id]
-        
         if 'error' in todo:
             await update.message.reply_text(f"❌ Erreur création: {todo['error']}")
             return True
         
-        priority_emoji = {'urgent': '🔴', 'important': '🟠', 'normal': '🟡'}.get(todo['priority'], '⚪')
+        priority_emoji = PRIORITY_EMOJI.get(todo['priority'], '⚪')
         
-        guide_text = ""
-        if result.get('guide'):
-            guide_text = "\n🧭 **Guide:**\n"
-            for i, step in enumerate(result['guide'][:5], 1):
-                guide_text += f"   {i}. {step}\n"
+        guide_text = guide_markdown(result.get('guide'))
         
         msg = f"""✅ **Tâche ajoutée!**
 
@@ -1011,12 +1222,11 @@ async def handle_pending_task_response(update: Update, message: str) -> bool:
         return True
     
     # Sinon, traiter comme réponse aux questions
-    await update.message.reply_text("🤖 Finalisation de la tâche...", parse_mode='Markdown')
-    
-    # Finaliser avec Claude
-    final_result = finalize_task_with_claude(pending['proposed_task'], message)
-    
-    del pending_tasks[chat_id]
+    # Finaliser avec Claude (dans un thread) pendant l'envoi de l'accusé de réception
+    _, final_result = await asyncio.gather(
+        update.message.reply_text("🤖 Finalisation de la tâche...", parse_mode='Markdown'),
+        asyncio.to_thread(finalize_task_with_claude, pending.proposal, message)
+    )
     
     if 'error' in final_result:
         await update.message.reply_text(f"❌ Erreur: {final_result['error']}")
@@ -1024,8 +1234,9 @@ async def handle_pending_task_response(update: Update, message: str) -> bool:
     
     # Créer la tâche finale
     description = format_guide_as_description(final_result)
-    todo = create_todo(
-        title=final_result.get('title', pending['proposed_task'].get('title', '')),
+    todo = await asyncio.to_thread(
+        create_todo,
+        title=final_result.get('title', pending.proposal.get('title', '')),
         category=final_result.get('category', 'easynode'),
         priority=final_result.get('priority', 'normal'),
         deadline=final_result.get('deadline'),
@@ -1037,13 +1248,9 @@ async def handle_pending_task_response(update: Update, message: str) -> bool:
         await update.message.reply_text(f"❌ Erreur création: {todo['error']}")
         return True
     
-    priority_emoji = {'urgent': '🔴', 'important': '🟠', 'normal': '🟡'}.get(todo['priority'], '⚪')
+    priority_emoji = PRIORITY_EMOJI.get(todo['priority'], '⚪')
     
-    guide_text = ""
-    if final_result.get('guide'):
-        guide_text = "\n🧭 **Guide:**\n"
-        for i, step in enumerate(final_result['guide'][:5], 1):
-            guide_text += f"   {i}. {step}\n"
+    guide_text = guide_markdown(final_result.get('guide'))
     
     deadline_text = ""
     if todo.get('deadline'):
@@ -1064,29 +1271,20 @@ async def handle_pending_task_response(update: Update, message: str) -> bool:
 async def process_create_event(update: Update, message: str):
     """Crée un événement calendrier à partir d'un message naturel."""
     chat_id = update.effective_chat.id
-    clean_expired_pending_tasks()
 
     await update.message.reply_text("🗓️ Analyse de l'événement...", parse_mode='Markdown')
 
-    try:
-        from src.agents.assistant_agent import parse_calendar_request, create_calendar_event
-    except Exception as e:
-        await update.message.reply_text(f"❌ Calendrier indisponible: {e}")
+    if assistant_agent is None:
+        await update.message.reply_text(f"❌ Calendrier indisponible: {ASSISTANT_AGENT_ERROR}")
         return
 
-    parsed = parse_calendar_request(message)
+    parsed = await run_agent(assistant_agent.parse_calendar_request, message)
     if parsed.get('error'):
         await update.message.reply_text(f"❌ Erreur: {parsed['error']}")
         return
 
     if parsed.get('needs_clarification'):
-        pending_events[chat_id] = {
-            'original_message': message,
-            'parsed_event': parsed,
-            'state': 'awaiting_response',
-            'timestamp': datetime.now(),
-            'message_id': update.message.message_id,
-        }
+        set_pending('event', chat_id, Pending(message, parsed, update.message.message_id))
 
         questions = parsed.get('questions') or []
         questions_text = "\n".join([f"   {i + 1}. {q}" for i, q in enumerate(questions[:2])])
@@ -1102,7 +1300,8 @@ async def process_create_event(update: Update, message: str):
         await update.message.reply_text("❌ Impossible de déterminer la date/heure. Reformule avec une date précise.")
         return
 
-    event = create_calendar_event(
+    event = await run_agent(
+        assistant_agent.create_calendar_event,
         summary=parsed.get('summary', 'Nouvel événement'),
         start_time=parsed.get('start_time'),
         end_time=parsed.get('end_time'),
@@ -1130,29 +1329,22 @@ async def process_create_event(update: Update, message: str):
 async def handle_pending_event_response(update: Update, message: str) -> bool:
     """Gère les réponses pour création d'événements en attente."""
     chat_id = update.effective_chat.id
-    clean_expired_pending_tasks()
 
-    if chat_id not in pending_events:
+    pending = take_pending('event', chat_id)
+    if pending is None:
         return False
 
-    pending = pending_events[chat_id]
-
-    if message.lower().strip() in ['annule', 'annuler', 'cancel', 'non', 'stop']:
-        del pending_events[chat_id]
+    if message.lower().strip() in CANCEL_WORDS:
         await update.message.reply_text("❌ Création d'événement annulée.", parse_mode='Markdown')
         return True
 
     await update.message.reply_text("🗓️ Finalisation de l'événement...", parse_mode='Markdown')
 
-    try:
-        from src.agents.assistant_agent import finalize_calendar_request, create_calendar_event
-    except Exception as e:
-        del pending_events[chat_id]
-        await update.message.reply_text(f"❌ Calendrier indisponible: {e}")
+    if assistant_agent is None:
+        await update.message.reply_text(f"❌ Calendrier indisponible: {ASSISTANT_AGENT_ERROR}")
         return True
 
-    final_parsed = finalize_calendar_request(pending['parsed_event'], message)
-    del pending_events[chat_id]
+    final_parsed = await run_agent(assistant_agent.finalize_calendar_request, pending.proposal, message)
 
     if final_parsed.get('error'):
         await update.message.reply_text(f"❌ Erreur: {final_parsed['error']}")
@@ -1166,7 +1358,8 @@ async def handle_pending_event_response(update: Update, message: str) -> bool:
         await update.message.reply_text("❌ Impossible de déterminer la date/heure. Reformule avec une date précise.")
         return True
 
-    event = create_calendar_event(
+    event = await run_agent(
+        assistant_agent.create_calendar_event,
         summary=final_parsed.get('summary', 'Nouvel événement'),
         start_time=final_parsed.get('start_time'),
         end_time=final_parsed.get('end_time'),
@@ -1202,7 +1395,7 @@ async def process_add_task_force(update: Update, message: str):
     Ajoute une tâche avec classification IA légère.
     Titre conservé tel quel, l'IA détecte juste catégorie + priorité.
     """
-    title = ' '.join(message.split()).strip()
+    title = normalize_message(message)
 
     if not title:
         await update.message.reply_text("❌ Titre de tâche requis.", parse_mode='Markdown')
@@ -1212,28 +1405,21 @@ async def process_add_task_force(update: Update, message: str):
     category = 'personnel'
     priority = 'normal'
     try:
-        response = claude.messages.create(
-            model=CLAUDE_MODEL,
-            max_tokens=60,
-            system="Classe cette tâche. Réponds UNIQUEMENT en JSON.",
-            messages=[{"role": "user", "content": f'Tâche: "{title}"\n\n{{"category":"easynode|immobilier|content|personnel|admin","priority":"urgent|important|normal"}}'}]
-        )
-        text = response.content[0].text.strip()
-        if text.startswith('```'):
-            text = re.sub(r'```json?\n?', '', text).replace('```', '')
-        result = json.loads(text)
+        result = orjson.loads(await asyncio.to_thread(
+            claude_json, "Classe cette tâche.", 60, 'classify_task', f'Tâche: "{title}"'
+        ))
         category = result.get('category', 'personnel')
         priority = result.get('priority', 'normal')
     except Exception as e:
         logger.warning(f"Force add classification failed, using defaults: {e}")
 
-    todo = create_todo(title=title, category=category, priority=priority)
+    todo = await asyncio.to_thread(create_todo, title=title, category=category, priority=priority)
 
     if 'error' in todo:
         await update.message.reply_text(f"❌ Erreur création: {todo['error']}")
         return
 
-    priority_emoji = {'urgent': '🔴', 'important': '🟠', 'normal': '🟡'}.get(priority, '⚪')
+    priority_emoji = PRIORITY_EMOJI.get(priority, '⚪')
 
     msg = f"""✅ **Tâche ajoutée!**
 
@@ -1246,7 +1432,7 @@ async def process_add_task_force(update: Update, message: str):
 
 async def process_complete_task(update: Update, identifier: str):
     """Traite la complétion d'une tâche."""
-    todos = get_todos(status='pending')
+    todos = await asyncio.to_thread(get_todos, 'pending')
 
     if not todos:
         await update.message.reply_text("❌ Aucune tâche en attente")
@@ -1275,7 +1461,7 @@ async def process_complete_task(update: Update, identifier: str):
 
     # Marquer comme terminée
     todo = matching[0]
-    result = update_todo(todo['id'], {'status': 'completed'})
+    result = await asyncio.to_thread(update_todo, todo['id'], {'status': 'completed'})
 
     if 'error' in result:
         await update.message.reply_text(f"❌ Erreur: {result['error']}")
@@ -1288,6 +1474,55 @@ async def process_complete_task(update: Update, identifier: str):
         parse_mode='Markdown'
     )
 
+
+async def on_complete_task(update: Update, context: ContextTypes.DEFAULT_TYPE, message: str):
+    """Intention 'complete_task' : extrait l'identifiant après le mot-clé."""
+    message_lower = message.lower()
+    match = COMPLETE_PREFIX_RE.search(message_lower)
+    await process_complete_task(update, message_lower[match.end():].strip() if match else message)
+
+
+async def on_generate_content(update: Update, context: ContextTypes.DEFAULT_TYPE, message: str):
+    """Intention 'generate_content' : extrait le sujet après le mot-clé."""
+    message_lower = message.lower()
+    match = CONTENT_PREFIX_RE.search(message_lower)
+    if match:
+        context.args = message_lower[match.end():].split()
+        await cmd_content(update, context)
+        return
+    await update.message.reply_text("Usage: `content <sujet>`", parse_mode='Markdown')
+
+
+async def on_add_task(update: Update, context: ContextTypes.DEFAULT_TYPE, message: str):
+    await process_add_task(update, message)
+
+
+async def on_create_event(update: Update, context: ContextTypes.DEFAULT_TYPE, message: str):
+    await process_create_event(update, message)
+
+
+def command_intent(handler):
+    """Adapte un handler de commande (update, context) à la signature (update, context, message)."""
+    async def on_intent(update: Update, context: ContextTypes.DEFAULT_TYPE, message: str):
+        await handler(update, context)
+    return on_intent
+
+
+# Intention détectée -> handler (update, context, message)
+INTENT_HANDLERS = {
+    'daily_briefing': command_intent(cmd_briefing),
+    'check_emails': command_intent(cmd_emails),
+    'add_task': on_add_task,
+    'create_event': on_create_event,
+    'complete_task': on_complete_task,
+    'generate_content': on_generate_content,
+    'list_tasks': command_intent(cmd_list),
+    'show_stats': command_intent(cmd_stats),
+    'focus': command_intent(cmd_focus),
+    'weekly_review': command_intent(cmd_review),
+}
+
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler pour les messages naturels (sans commande)."""
     message = update.message.text
@@ -1304,55 +1539,9 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if await handle_pending_task_response(update, message):
         return  # Message traité comme réponse à une tâche en attente
 
-    # Détecter l'intention (SANS Claude = 0 tokens)
+    # Détecter l'intention (SANS Claude = 0 tokens) ; par défaut, nouvelle tâche
     intent = detect_intent(message)
-
-    if intent == 'daily_briefing':
-        await cmd_briefing(update, context)
-
-    elif intent == 'check_emails':
-        await cmd_emails(update, context)
-
-    elif intent == 'add_task':
-        await process_add_task(update, message)
-
-    elif intent == 'create_event':
-        await process_create_event(update, message)
-
-    elif intent == 'complete_task':
-        # Extraire l'identifiant
-        for pattern in ['fait ', 'done ', 'terminé ', 'fini ', '✅ ']:
-            if pattern in message.lower():
-                identifier = message.lower().split(pattern, 1)[1].strip()
-                await process_complete_task(update, identifier)
-                return
-        await process_complete_task(update, message)
-
-    elif intent == 'generate_content':
-        # Extraire le sujet
-        for pattern in ['content ', 'tweet ', 'post ', 'linkedin ']:
-            if pattern in message.lower():
-                subject = message.lower().split(pattern, 1)[1].strip()
-                context.args = subject.split()
-                await cmd_content(update, context)
-                return
-        await update.message.reply_text("Usage: `content <sujet>`", parse_mode='Markdown')
-
-    elif intent == 'list_tasks':
-        await cmd_list(update, context)
-
-    elif intent == 'show_stats':
-        await cmd_stats(update, context)
-
-    elif intent == 'focus':
-        await cmd_focus(update, context)
-
-    elif intent == 'weekly_review':
-        await cmd_review(update, context)
-
-    else:
-        # Par défaut, traiter comme nouvelle tâche
-        await process_add_task(update, message)
+    await INTENT_HANDLERS.get(intent, on_add_task)(update, context, message)
 
 
 # =============================================================================
@@ -16,6 +16,12 @@ DASHBOARD_API_URL = os.getenv('DASHBOARD_API_URL', 'http://localhost:5001/api')
 DASHBOARD_PUBLIC_URL = os.getenv('DASHBOARD_PUBLIC_URL')
 
 TIMEZONE = os.getenv('TIMEZONE', 'Europe/Paris')
+# Set to 0 on processes that must not run the background jobs (reminders, recaps, daily content)
+RUN_SCHEDULER = os.getenv('RUN_SCHEDULER', '1') == '1'
+# flock target electing the single process (e.g. gunicorn worker) that runs the scheduler
+SCHEDULER_LOCK_PATH = os.getenv('SCHEDULER_LOCK_PATH', f'{DATABASE_PATH}.sched.lock')
 DCA_BACKEND_URL = os.getenv('DCA_BACKEND_URL', 'http://84.46.253.225:8000/analyze')
 DCA_APP_URL = os.getenv('DCA_APP_URL', 'http://127.0.0.1:3000')
 PORT = int(os.getenv('PORT', '5001'))
+# Werkzeug reloader + debugger for `python3 -m src.app` (never in production)
+DEBUG = os.getenv('DEBUG', '0') == '1'
@@ -1,6 +1,9 @@
+import atexit
 import os
 import sqlite3
+import threading
 from contextlib import contextmanager
+from datetime import datetime
 
 from src.config import DATABASE_PATH
 
@@ -11,12 +14,75 @@ def ensure_db_dir() -> None:
         os.makedirs(db_dir, exist_ok=True)
 
 
+# Shared ORDER BY fragment: urgent, then important, then the rest
+SQL_PRIORITY_ORDER = "CASE priority WHEN 'urgent' THEN 1 WHEN 'important' THEN 2 ELSE 3 END"
+
+# sqlite3 keeps this many prepared statements per connection (default 128)
+STATEMENT_CACHE_SIZE = 256
+
+# INSERT/UPDATE ... RETURNING needs SQLite 3.35+
+HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# Per-connection settings (journal_mode=WAL is persistent and set once in init_db)
+CONNECTION_PRAGMAS = '''
+    PRAGMA synchronous = NORMAL;
+    PRAGMA temp_store = MEMORY;
+    PRAGMA mmap_size = 268435456;
+    PRAGMA cache_size = -64000;
+    PRAGMA foreign_keys = ON;
+'''
+
+
 def get_db() -> sqlite3.Connection:
-    conn = sqlite3.connect(DATABASE_PATH)
+    conn = sqlite3.connect(DATABASE_PATH, cached_statements=STATEMENT_CACHE_SIZE)
     conn.row_factory = sqlite3.Row
+    conn.executescript(CONNECTION_PRAGMAS)
+    return conn
+
+
+_local = threading.local()
+# Thread ident -> connection, so connections of finished threads get closed
+_open_conns = {}
+_open_conns_lock = threading.Lock()
+
+
+def get_conn() -> sqlite3.Connection:
+    """Return this thread's long-lived connection (autocommit; group writes with writer())."""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False, isolation_level=None,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        conn.row_factory = sqlite3.Row
+        conn.executescript(CONNECTION_PRAGMAS)
+        _local.conn = conn
+        with _open_conns_lock:
+            _prune_dead_conns()
+            _open_conns[threading.get_ident()] = conn
     return conn
 
 
+def _prune_dead_conns() -> None:
+    # Thread-per-request servers (flask run) would otherwise pile up one connection per request
+    alive = {t.ident for t in threading.enumerate()}
+    for ident in [i for i in _open_conns if i not in alive]:
+        _open_conns.pop(ident).close()
+
+
+def release_conn() -> None:
+    """Roll back anything a failed request left open on this thread's connection."""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and conn.in_transaction:
+        conn.rollback()
+
+
+@atexit.register
+def _close_conns() -> None:
+    with _open_conns_lock:
+        for conn in _open_conns.values():
+            conn.close()
+        _open_conns.clear()
+
+
 @contextmanager
 def db_conn():
     conn = get_db()
@@ -27,11 +93,113 @@ def db_conn():
         conn.close()
 
 
+@contextmanager
+def writer(conn: sqlite3.Connection):
+    """Run a block of writes in a BEGIN IMMEDIATE transaction (commit or rollback)."""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+TODO_COLUMNS_V1 = (
+    ('recurrence_pattern', 'TEXT'),
+    ('recurrence_end_date', 'DATE'),
+    ('parent_todo_id', 'INTEGER'),
+    ('archived', 'INTEGER DEFAULT 0'),
+)
+
+
+HABIT_COLUMNS_V2 = (
+    ('streak', 'INTEGER DEFAULT 0'),
+    ('streak_date', 'DATE'),
+)
+
+# Claude response cache (created by migration v3): expiry as integer unix milliseconds
+AI_CACHE_TABLES_V3 = (
+    ('ai_cache', '''
+        CREATE TABLE ai_cache (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cache_key TEXT UNIQUE NOT NULL,
+            cache_type TEXT NOT NULL,
+            result_json BLOB NOT NULL,
+            todo_id INTEGER,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            expires_ms INTEGER NOT NULL
+        )
+    '''),
+    # List-type caches (session context): one row per event
+    ('ai_cache_events', '''
+        CREATE TABLE ai_cache_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cache_key TEXT NOT NULL,
+            event_json BLOB NOT NULL,
+            expires_ms INTEGER NOT NULL
+        )
+    '''),
+)
+
+# Longest streak walked back (in days)
+HABIT_STREAK_MAX_DAYS = 30
+
+# Materialized streaks: consecutive completed days ending at streak_date (params:
+# today, habit id or None for all, max days, today, habit id or None)
+SQL_REFRESH_HABIT_STREAKS = '''
+    WITH RECURSIVE streak(habit_id, day, n) AS (
+        SELECT habit_id, date, 1 FROM habit_tracking
+        WHERE date = ? AND completed = 1 AND habit_id = COALESCE(?, habit_id)
+        UNION ALL
+        SELECT s.habit_id, date(s.day, '-1 day'), s.n + 1
+        FROM streak s
+        JOIN habit_tracking ht ON ht.habit_id = s.habit_id
+            AND ht.date = date(s.day, '-1 day') AND ht.completed = 1
+        WHERE s.n < ?
+    )
+    UPDATE habits SET
+        streak = COALESCE((SELECT MAX(n) FROM streak WHERE streak.habit_id = habits.id), 0),
+        streak_date = ?
+    WHERE id = COALESCE(?, id)
+'''
+
+
+def refresh_habit_streaks(conn: sqlite3.Connection, today: str, habit_id: int = None) -> None:
+    """Recompute the stored streak of one habit (or all of them) as of `today`; call inside writer()."""
+    conn.execute(SQL_REFRESH_HABIT_STREAKS, (today, habit_id, HABIT_STREAK_MAX_DAYS, today, habit_id))
+
+
+def bulk_insert(conn: sqlite3.Connection, table: str, columns, rows, conflict: str = '') -> None:
+    """Insert many rows with one prepared statement inside a single BEGIN IMMEDIATE transaction.
+
+    conflict is an optional 'OR IGNORE' / 'OR REPLACE' clause.
+    """
+    verb = f'INSERT {conflict}' if conflict else 'INSERT'
+    sql = f"{verb} INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    with writer(conn):
+        conn.executemany(sql, rows)
+
+
+DEFAULT_CATEGORIES = (
+    ('easynode', '🚀', '#3b82f6'),
+    ('immobilier', '🏠', '#10b981'),
+    ('personnel', '👤', '#8b5cf6'),
+    ('content', '📱', '#f59e0b'),
+    ('admin', '📄', '#6b7280'),
+)
+
+
 def init_db() -> None:
     ensure_db_dir()
 
     conn = get_db()
+    # WAL lets readers proceed while a write is in flight
+    conn.execute('PRAGMA journal_mode = WAL')
+    # Whole schema in one transaction (one commit instead of one per statement)
     conn.executescript('''
+        BEGIN;
+
         CREATE TABLE IF NOT EXISTS todos (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             title TEXT NOT NULL,
@@ -74,14 +242,6 @@ def init_db() -> None:
             created_at DATETIME DEFAULT CURRENT_TIMESTAMP
         );
 
-        -- Insert default categories
-        INSERT OR IGNORE INTO categories (name, emoji, color) VALUES
-            ('easynode', '🚀', '#3b82f6'),
-            ('immobilier', '🏠', '#10b981'),
-            ('personnel', '👤', '#8b5cf6'),
-            ('content', '📱', '#f59e0b'),
-            ('admin', '📄', '#6b7280');
-
         -- Historique pour analytics de productivité
         CREATE TABLE IF NOT EXISTS task_history (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -110,41 +270,7 @@ def init_db() -> None:
             completed INTEGER DEFAULT 0,
             UNIQUE(habit_id, date)
         );
-    ''')
-
-    # AI Cache table for caching Claude responses
-    conn.executescript('''
-        CREATE TABLE IF NOT EXISTS ai_cache (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            cache_key TEXT UNIQUE NOT NULL,
-            cache_type TEXT NOT NULL,
-            result_json TEXT NOT NULL,
-            todo_id INTEGER,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            expires_at DATETIME NOT NULL
-        );
-    ''')
-
-    # Add recurrence columns if not exist (safe migration)
-    try:
-        conn.execute('ALTER TABLE todos ADD COLUMN recurrence_pattern TEXT')
-    except Exception:
-        pass
-    try:
-        conn.execute('ALTER TABLE todos ADD COLUMN recurrence_end_date DATE')
-    except Exception:
-        pass
-    try:
-        conn.execute('ALTER TABLE todos ADD COLUMN parent_todo_id INTEGER')
-    except Exception:
-        pass
-    try:
-        conn.execute('ALTER TABLE todos ADD COLUMN archived INTEGER DEFAULT 0')
-    except Exception:
-        pass
 
-    # Create projects table
-    conn.executescript('''
         CREATE TABLE IF NOT EXISTS projects (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             name TEXT NOT NULL,
@@ -155,6 +281,62 @@ def init_db() -> None:
             created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
             updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
         );
+
+        COMMIT;
     ''')
+
+    # Insert default categories
+    bulk_insert(conn, 'categories', ('name', 'emoji', 'color'), DEFAULT_CATEGORIES, conflict='OR IGNORE')
+
+    # Versioned migrations: one transaction, skipped once user_version is current.
+    # Version 1 adds the recurrence/archive columns; databases created before the
+    # version stamp may already have some of them, hence the table_info check.
+    # Version 2 adds the materialized habit streak and backfills it.
+    # Version 3 recreates the AI cache tables with integer expiries (cache content
+    # is disposable, so old rows are dropped rather than converted).
+    with writer(conn):
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version < 1:
+            existing = {row['name'] for row in conn.execute('PRAGMA table_info(todos)')}
+            for column, ddl in TODO_COLUMNS_V1:
+                if column not in existing:
+                    conn.execute(f'ALTER TABLE todos ADD COLUMN {column} {ddl}')
+            conn.execute('PRAGMA user_version = 1')
+        if version < 2:
+            existing = {row['name'] for row in conn.execute('PRAGMA table_info(habits)')}
+            for column, ddl in HABIT_COLUMNS_V2:
+                if column not in existing:
+                    conn.execute(f'ALTER TABLE habits ADD COLUMN {column} {ddl}')
+            refresh_habit_streaks(conn, datetime.now().date().isoformat())
+            conn.execute('PRAGMA user_version = 2')
+        if version < 3:
+            for table, ddl in AI_CACHE_TABLES_V3:
+                conn.execute(f'DROP TABLE IF EXISTS {table}')
+                conn.execute(ddl)
+            conn.execute('PRAGMA user_version = 3')
+
+    # Indexes for the deadline scan, the analytics per-day counts, the calendar
+    # month range, the recurring-task spawner, the habit streak anchor
+    # (habit_tracking(habit_id, date) is already covered by its UNIQUE
+    # constraint) and the AI cache purge
+    conn.executescript('''
+        BEGIN;
+        CREATE INDEX IF NOT EXISTS idx_todos_status_deadline ON todos(status, deadline) WHERE archived = 0;
+        CREATE INDEX IF NOT EXISTS idx_todos_completed_at ON todos(date(completed_at));
+        CREATE INDEX IF NOT EXISTS idx_todos_created_date ON todos(date(created_at));
+        CREATE INDEX IF NOT EXISTS idx_todos_deadline_pending ON todos(deadline)
+            WHERE status = 'pending' AND reminder_sent = 0;
+        CREATE INDEX IF NOT EXISTS idx_todos_status_archived ON todos(status, archived);
+        CREATE INDEX IF NOT EXISTS idx_todos_deadline ON todos(deadline) WHERE deadline IS NOT NULL;
+        CREATE INDEX IF NOT EXISTS idx_todos_recurrence ON todos(status, recurrence_pattern)
+            WHERE recurrence_pattern IS NOT NULL;
+        CREATE INDEX IF NOT EXISTS idx_ht_date_completed ON habit_tracking(date, habit_id) WHERE completed = 1;
+        CREATE INDEX IF NOT EXISTS idx_ai_cache_expires ON ai_cache(expires_ms);
+        CREATE INDEX IF NOT EXISTS idx_ai_cache_events_key ON ai_cache_events(cache_key, id);
+        COMMIT;
+    ''')
+
+    # Refresh planner statistics so the partial indexes get picked (cheap at this size)
+    conn.execute('ANALYZE')
     conn.commit()
     conn.close()
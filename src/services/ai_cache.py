@@ -1,99 +1,170 @@
 """
 AI Cache Service - SQLite-based cache for Claude API responses.
 Reduces API costs by caching results with configurable TTL.
+Uses the thread's long-lived autocommit connection (src.db.get_conn).
 """
 
-import json
-from datetime import datetime, timedelta
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
 
-from src.db import get_db
+import orjson
+
+from src.db import get_conn
+
+# In-process LRU in front of SQLite: cache_key -> (hot_until, payload bytes, created_at).
+# Kept short-lived because another process (bot, other gunicorn worker) may invalidate the row.
+HOT_CACHE_SIZE = 512
+HOT_CACHE_SECONDS = 30
+_hot = OrderedDict()
+_hot_lock = threading.Lock()
+
+
+def now_ms() -> int:
+    """Current unix time in milliseconds (expiry unit of the cache tables)."""
+    return time.time_ns() // 1_000_000
+
+
+def _hot_get(cache_key: str):
+    with _hot_lock:
+        entry = _hot.get(cache_key)
+        if entry is None:
+            return None
+        if time.monotonic() >= entry[0]:
+            del _hot[cache_key]
+            return None
+        _hot.move_to_end(cache_key)
+        return entry
+
+
+def _hot_put(cache_key: str, seconds: float, payload, created_at) -> None:
+    with _hot_lock:
+        _hot[cache_key] = (time.monotonic() + min(HOT_CACHE_SECONDS, seconds), payload, created_at)
+        _hot.move_to_end(cache_key)
+        if len(_hot) > HOT_CACHE_SIZE:
+            _hot.popitem(last=False)
+
+
+def _hot_drop(match) -> None:
+    with _hot_lock:
+        for key in [key for key in _hot if match(key)]:
+            del _hot[key]
+
+
+def _load(payload, created_at) -> dict:
+    # Decoded on every hit so callers get their own dict to mutate
+    result = orjson.loads(payload)
+    result['_cached'] = True
+    result['_cached_at'] = created_at
+    return result
 
 
 def get_cached(cache_key: str) -> dict | None:
     """Get a cached result by key. Returns None if expired or not found."""
-    conn = get_db()
-    cursor = conn.cursor()
+    hot = _hot_get(cache_key)
+    if hot:
+        return _load(hot[1], hot[2])
+
+    now = now_ms()
+    cursor = get_conn().cursor()
     cursor.execute('''
-        SELECT result_json, created_at FROM ai_cache
-        WHERE cache_key = ? AND expires_at > ?
-    ''', (cache_key, datetime.now().isoformat()))
+        SELECT result_json, created_at, expires_ms FROM ai_cache
+        WHERE cache_key = ? AND expires_ms > ?
+    ''', (cache_key, now))
     row = cursor.fetchone()
-    conn.close()
 
     if row:
-        result = json.loads(row['result_json'])
-        result['_cached'] = True
-        result['_cached_at'] = row['created_at']
-        return result
+        remaining = (row['expires_ms'] - now) / 1000
+        _hot_put(cache_key, remaining, row['result_json'], row['created_at'])
+        return _load(row['result_json'], row['created_at'])
     return None
 
 
 def set_cached(cache_key: str, cache_type: str, result: dict, ttl_hours: float, todo_id: int = None) -> None:
     """Store a result in cache with TTL."""
-    conn = get_db()
-    cursor = conn.cursor()
-    expires_at = (datetime.now() + timedelta(hours=ttl_hours)).isoformat()
-    result_json = json.dumps(result, ensure_ascii=False)
+    cursor = get_conn().cursor()
+    expires_ms = now_ms() + int(ttl_hours * 3_600_000)
+    result_json = orjson.dumps(result)
 
     cursor.execute('''
-        INSERT INTO ai_cache (cache_key, cache_type, result_json, todo_id, expires_at)
+        INSERT INTO ai_cache (cache_key, cache_type, result_json, todo_id, expires_ms)
         VALUES (?, ?, ?, ?, ?)
         ON CONFLICT(cache_key) DO UPDATE SET
             result_json = excluded.result_json,
             todo_id = excluded.todo_id,
-            expires_at = excluded.expires_at,
+            expires_ms = excluded.expires_ms,
             created_at = CURRENT_TIMESTAMP
-    ''', (cache_key, cache_type, result_json, todo_id, expires_at))
-    conn.commit()
-    conn.close()
+    ''', (cache_key, cache_type, result_json, todo_id, expires_ms))
+    _hot_drop(cache_key.__eq__)
 
 
 def invalidate(cache_key: str) -> None:
     """Delete a specific cache entry."""
-    conn = get_db()
-    cursor = conn.cursor()
+    cursor = get_conn().cursor()
     cursor.execute('DELETE FROM ai_cache WHERE cache_key = ?', (cache_key,))
-    conn.commit()
-    conn.close()
+    _hot_drop(cache_key.__eq__)
 
 
 def invalidate_pattern(prefix: str) -> None:
     """Invalidate all cache entries matching a key prefix."""
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM ai_cache WHERE cache_key LIKE ?', (prefix + '%',))
-    conn.commit()
-    conn.close()
+    cursor = get_conn().cursor()
+    if not prefix:
+        # Every key matches the empty prefix
+        cursor.execute('DELETE FROM ai_cache')
+        _hot_drop(lambda key: True)
+        return
+    # Key range instead of LIKE 'prefix%' (case-insensitive, so it cannot use the cache_key index)
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    cursor.execute('DELETE FROM ai_cache WHERE cache_key >= ? AND cache_key < ?', (prefix, upper))
+    _hot_drop(lambda key: key.startswith(prefix))
+
+
+# Expired rows purged per statement, so the purge never holds the write lock for long
+CLEANUP_BATCH_SIZE = 1000
 
 
 def cleanup_expired() -> int:
     """Remove all expired cache entries. Returns count of deleted rows."""
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM ai_cache WHERE expires_at <= ?', (datetime.now().isoformat(),))
-    deleted = cursor.rowcount
-    conn.commit()
-    conn.close()
-    return deleted
-
-
-def append_to_cache(cache_key: str, cache_type: str, event: dict, ttl_hours: float, max_items: int = 20) -> None:
-    """Append an event to a list-type cache entry (e.g. session context)."""
-    existing = get_cached(cache_key)
-    if existing:
-        existing.pop('_cached', None)
-        existing.pop('_cached_at', None)
-        events = existing.get('events', [])
-    else:
-        events = []
-
-    events.append({
-        'timestamp': datetime.now().isoformat(),
-        **event
-    })
-
+    cursor = get_conn().cursor()
+    now = now_ms()
+    deleted = 0
+    while True:
+        cursor.execute('''
+            DELETE FROM ai_cache WHERE id IN (
+                SELECT id FROM ai_cache WHERE expires_ms <= ? LIMIT ?
+            )
+        ''', (now, CLEANUP_BATCH_SIZE))
+        deleted += cursor.rowcount
+        if cursor.rowcount < CLEANUP_BATCH_SIZE:
+            break
+    cursor.execute('DELETE FROM ai_cache_events WHERE expires_ms <= ?', (now,))
+    return deleted + cursor.rowcount
+
+
+def append_to_cache(cache_key: str, event: dict, ttl_hours: float, max_items: int = 20) -> None:
+    """Append an event to a list-type cache (e.g. session context): one row per event."""
+    cursor = get_conn().cursor()
+    payload = orjson.dumps({'timestamp': datetime.now().isoformat(), **event})
+    cursor.execute(
+        'INSERT INTO ai_cache_events (cache_key, event_json, expires_ms) VALUES (?, ?, ?)',
+        (cache_key, payload, now_ms() + int(ttl_hours * 3_600_000))
+    )
     # Keep only the most recent items
-    if len(events) > max_items:
-        events = events[-max_items:]
+    cursor.execute('''
+        DELETE FROM ai_cache_events WHERE cache_key = ? AND id <= (
+            SELECT id FROM ai_cache_events WHERE cache_key = ?
+            ORDER BY id DESC LIMIT 1 OFFSET ?
+        )
+    ''', (cache_key, cache_key, max_items))
 
-    set_cached(cache_key, cache_type, {'events': events}, ttl_hours)
+
+def get_cached_events(cache_key: str, limit: int = 20) -> list:
+    """Most recent unexpired events of a list-type cache, oldest first."""
+    cursor = get_conn().cursor()
+    cursor.execute('''
+        SELECT event_json FROM ai_cache_events
+        WHERE cache_key = ? AND expires_ms > ?
+        ORDER BY id DESC LIMIT ?
+    ''', (cache_key, now_ms(), limit))
+    return [orjson.loads(row['event_json']) for row in reversed(cursor.fetchall())]
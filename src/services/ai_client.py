@@ -1,9 +1,32 @@
+import re
+import threading
+
 import anthropic
 
 from src.config import ANTHROPIC_API_KEY
 
+# Body of a ```json ... ``` fence around a model answer (one compiled pattern for every caller)
+FENCE_RE = re.compile(r'```(?:json)?\s*(.*?)\s*```', re.DOTALL)
+
+
+# One client per process: it owns the httpx connection pool, so calls share keep-alive sockets
+_client = None
+_client_lock = threading.Lock()
+
 
 def get_claude_client():
+    global _client
+    if _client is not None:
+        return _client
     if not ANTHROPIC_API_KEY:
         return None
-    return anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+    with _client_lock:
+        if _client is None:
+            _client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+    return _client
+
+
+def strip_json_fences(text: str) -> str:
+    """Return the JSON inside a markdown code fence, or the stripped text when there is none."""
+    match = FENCE_RE.search(text)
+    return match.group(1) if match else text.strip()
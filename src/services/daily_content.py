@@ -1,27 +1,19 @@
-import json
+import hashlib
 from datetime import datetime
 
+import orjson
+
 from src.config import CLAUDE_MODEL
-from src.db import get_db
+from src.db import HAS_RETURNING, get_db
+from src.services.ai_cache import get_cached, set_cached
 from src.services.ai_client import get_claude_client
 
 
-def generate_daily_content() -> None:
-    claude = get_claude_client()
-    if not claude:
-        return
+# Upper bound on the Claude round-trip (the SDK default is 10 minutes)
+CLAUDE_TIMEOUT_SECONDS = 30
 
-    today = datetime.now().date().isoformat()
-
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('SELECT id FROM daily_content WHERE date = ?', (today,))
-    if cursor.fetchone():
-        conn.close()
-        return
-
-    try:
-        prompt = """Génère en JSON:
+DAILY_CONTENT_SYSTEM = "Tu génères du contenu quotidien inspirant et éducatif. Réponds uniquement en JSON valide."
+DAILY_CONTENT_PROMPT = """Génère en JSON:
 {
   \"quote\": \"citation inspirante sur la tech, IA, productivité ou entrepreneuriat (max 120 chars)\",
   \"author\": \"auteur de la citation\",
@@ -29,24 +21,75 @@ def generate_daily_content() -> None:
 }
 
 Sois concis, impactant, en français."""
+# Exact-match cache of the Claude answer, per day: a retry, a restart or a deleted
+# date row on the same day reuses it instead of paying for a new call
+DAILY_CONTENT_CACHE_HOURS = 24
+DAILY_CONTENT_PROMPT_HASH = hashlib.sha256(orjson.dumps(
+    {'model': CLAUDE_MODEL, 'system': DAILY_CONTENT_SYSTEM, 'prompt': DAILY_CONTENT_PROMPT},
+    option=orjson.OPT_SORT_KEYS,
+)).hexdigest()
+
+
+def daily_content_cache_key(day: str) -> str:
+    return f'llm:{DAILY_CONTENT_PROMPT_HASH}:{day}'
+
 
-        response = claude.messages.create(
-            model=CLAUDE_MODEL,
-            max_tokens=300,
-            system="Tu génères du contenu quotidien inspirant et éducatif. Réponds uniquement en JSON valide.",
-            messages=[{"role": "user", "content": prompt}],
-        )
+SQL_INSERT_DAILY_CONTENT = '''
+    INSERT INTO daily_content (date, quote, quote_author, fun_fact)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(date) DO NOTHING
+'''
+SQL_INSERT_DAILY_CONTENT_RETURNING = SQL_INSERT_DAILY_CONTENT + ' RETURNING *'
 
-        text = response.content[0].text.strip()
-        if text.startswith('```'):
-            text = text.replace('```json', '').replace('```', '').strip()
 
-        data = json.loads(text)
+def generate_daily_content(force: bool = False) -> dict | None:
+    """Ensure today's row exists and return it (None if Claude is unavailable or failed).
+
+    force skips the cached Claude answer so an explicit regenerate gets new content.
+    """
+    claude = get_claude_client()
+    if not claude:
+        return None
+
+    today = datetime.now().date().isoformat()
+
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM daily_content WHERE date = ?', (today,))
+    existing = cursor.fetchone()
+    if existing:
+        conn.close()
+        return dict(existing)
+
+    try:
+        cache_key = daily_content_cache_key(today)
+        data = None if force else get_cached(cache_key)
+        if data is None:
+            response = claude.messages.create(
+                model=CLAUDE_MODEL,
+                max_tokens=300,
+                timeout=CLAUDE_TIMEOUT_SECONDS,
+                system=DAILY_CONTENT_SYSTEM,
+                messages=[{"role": "user", "content": DAILY_CONTENT_PROMPT}],
+            )
+
+            # Slice the outer object: skips ```json fences and any preamble without scanning for them
+            text = response.content[0].text
+            data = orjson.loads(text[text.find('{'):text.rfind('}') + 1])
+            set_cached(cache_key, 'daily_content', data, ttl_hours=DAILY_CONTENT_CACHE_HOURS)
 
-        cursor.execute('''
-            INSERT INTO daily_content (date, quote, quote_author, fun_fact)
-            VALUES (?, ?, ?, ?)
-        ''', (today, data['quote'], data['author'], data['fun_fact']))
+        params = (today, data['quote'], data['author'], data['fun_fact'])
+        rows = []
+        if HAS_RETURNING:
+            cursor.execute(SQL_INSERT_DAILY_CONTENT_RETURNING, params)
+            rows = cursor.fetchall()
+        else:
+            cursor.execute(SQL_INSERT_DAILY_CONTENT, params)
+        if not rows:
+            # Another worker inserted today's row first: keep theirs
+            cursor.execute('SELECT * FROM daily_content WHERE date = ?', (today,))
+            rows = cursor.fetchall()
         conn.commit()
+        return dict(rows[0]) if rows else None
     finally:
         conn.close()
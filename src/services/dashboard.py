@@ -0,0 +1,77 @@
+"""
+Dashboard read queries, shared by the Flask API and the co-located Telegram bot.
+"""
+
+from datetime import datetime
+
+from src.db import SQL_PRIORITY_ORDER
+
+
+SQL_TODOS_BASE = '''SELECT t.*,
+        (SELECT COUNT(*) FROM todos st WHERE st.parent_todo_id = t.id) as subtask_count,
+        (SELECT COUNT(*) FROM todos st WHERE st.parent_todo_id = t.id AND st.status = 'completed') as subtask_done_count
+        FROM todos t WHERE 1=1'''
+
+_TODOS_QUERY_CACHE = {}
+
+
+def todos_query(include_children, archived, by_status, by_category):
+    """Return the todos SELECT for one filter combination (at most 24 variants, built once each)."""
+    key = (include_children, archived, by_status, by_category)
+    query = _TODOS_QUERY_CACHE.get(key)
+    if query is not None:
+        return query
+
+    query = SQL_TODOS_BASE
+    # Hide sub-tasks by default
+    if not include_children:
+        query += ' AND t.parent_todo_id IS NULL'
+
+    if archived == '1':
+        query += ' AND t.archived = 1'
+    elif archived == '0':
+        query += ' AND t.archived = 0'
+    else:
+        # Default behavior: hide archived AND completed unless specifically requested
+        query += " AND t.archived = 0 AND t.status != 'completed'"
+
+    if by_status:
+        query += ' AND t.status = ?'
+    if by_category:
+        query += ' AND t.category = ?'
+
+    query += f' ORDER BY {SQL_PRIORITY_ORDER}, t.deadline ASC'
+    _TODOS_QUERY_CACHE[key] = query
+    return query
+
+
+SQL_STATS = '''
+    SELECT COUNT(*) as total,
+        COALESCE(SUM(status = 'completed'), 0) as completed,
+        COALESCE(SUM(status = 'pending'), 0) as pending,
+        COALESCE(SUM(status = 'completed' AND date(completed_at) = ?), 0) as today_completed,
+        COALESCE(SUM(status = 'pending' AND deadline < ?), 0) as overdue
+    FROM todos
+'''
+
+
+def compute_stats(cursor) -> dict:
+    """Dashboard counters, all from a single scan of todos."""
+    now = datetime.now()
+    cursor.execute(SQL_STATS, (now.date().isoformat(), now.isoformat()))
+    total, completed, pending, today_completed, overdue = cursor.fetchone()
+
+    completion_rate = round((completed / total * 100) if total > 0 else 0, 1)
+
+    return {
+        'total': total,
+        'completed': completed,
+        'pending': pending,
+        'today_completed': today_completed,
+        'overdue': overdue,
+        'completion_rate': completion_rate
+    }
+
+
+SQL_ROADMAP = 'SELECT * FROM roadmap_items ORDER BY target_date ASC, created_at DESC'
+SQL_ROADMAP_BY_TYPE = 'SELECT * FROM roadmap_items WHERE type = ? ORDER BY target_date ASC, created_at DESC'
@@ -1,31 +1,85 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from functools import lru_cache
 from dateutil.relativedelta import relativedelta
 
-from src.db import get_db
+from src.config import TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID
+from src.db import SQL_PRIORITY_ORDER, bulk_insert, get_conn
 from src.services.telegram import send_telegram_message
 
 
+PRIORITY_EMOJI = {'urgent': '🔴', 'important': '🟠', 'normal': '🟡'}
+
+# Pinned to the partial index (pending, reminder not sent): without ANALYZE stats
+# (fresh or small database) the planner otherwise walks every pending row by status
+SQL_DEADLINE_SCAN = '''
+    SELECT id, title, category, priority, deadline
+    FROM todos INDEXED BY idx_todos_deadline_pending
+    WHERE status = 'pending'
+    AND deadline IS NOT NULL
+    AND deadline <= ?
+    AND deadline >= ?
+    AND reminder_sent = 0
+'''
+
+# Today's counters computed inside the upsert itself (one statement instead of four)
+SQL_RECORD_DAILY_STATS = '''
+    INSERT INTO task_history (date, completed_count, created_count, pending_count)
+    VALUES (
+        :today,
+        (SELECT COUNT(*) FROM todos WHERE status = 'completed' AND date(completed_at) = :today),
+        (SELECT COUNT(*) FROM todos WHERE date(created_at) = :today),
+        (SELECT COUNT(*) FROM todos WHERE status = 'pending')
+    )
+    ON CONFLICT(date) DO UPDATE SET
+        completed_count = excluded.completed_count,
+        created_count = excluded.created_count,
+        pending_count = excluded.pending_count
+'''
+
+# Both counters and today's quote in one row (the LEFT JOIN keeps the row when there is no quote)
+SQL_RECAP_SUMMARY = '''
+    SELECT
+        (SELECT COUNT(*) FROM todos WHERE status = 'pending') AS pending,
+        (SELECT COUNT(*) FROM todos
+         WHERE status = 'completed' AND date(completed_at) = :today) AS completed_today,
+        dc.quote,
+        dc.quote_author
+    FROM (SELECT 1)
+    LEFT JOIN daily_content dc ON dc.date = :today
+'''
+
+SQL_RECAP_PRIORITIES = f'''
+    SELECT title, priority FROM todos
+    WHERE status = 'pending'
+    ORDER BY {SQL_PRIORITY_ORDER}
+    LIMIT 5
+'''
+
+# Concurrent Telegram sends in check_deadlines (network waits overlap)
+REMINDER_SEND_WORKERS = 5
+
+
 def check_deadlines() -> None:
-    conn = get_db()
+    # Nothing could be sent, so leave the rows (and reminder_sent) untouched
+    if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
+        return
+
+    conn = get_conn()
     cursor = conn.cursor()
 
     now = datetime.now()
     soon = now + timedelta(hours=1)
 
-    cursor.execute('''
-        SELECT id, title, category, priority, deadline
-        FROM todos
-        WHERE status = 'pending'
-        AND deadline IS NOT NULL
-        AND deadline <= ?
-        AND deadline >= ?
-        AND reminder_sent = 0
-    ''', (soon.isoformat(), now.isoformat()))
+    cursor.execute(SQL_DEADLINE_SCAN, (soon.isoformat(), now.isoformat()))
 
+    # Autocommit connection: no read transaction stays open while Telegram answers
     todos = cursor.fetchall()
+    if not todos:
+        return
 
-    for todo in todos:
-        priority_emoji = {'urgent': '🔴', 'important': '🟠', 'normal': '🟡'}.get(todo['priority'], '⚪')
+    def send_reminder(todo):
+        priority_emoji = PRIORITY_EMOJI.get(todo['priority'], '⚪')
         message = f"""⏰ <b>Rappel - Deadline proche!</b>
 
 {priority_emoji} <b>{todo['title']}</b>
@@ -33,47 +87,23 @@ def check_deadlines() -> None:
 ⏳ Deadline: {todo['deadline']}
 
 <i>Il est temps de finaliser cette tâche!</i>"""
+        return send_telegram_message(message)
 
-        if send_telegram_message(message):
-            cursor.execute('UPDATE todos SET reminder_sent = 1 WHERE id = ?', (todo['id'],))
+    with ThreadPoolExecutor(max_workers=min(REMINDER_SEND_WORKERS, len(todos))) as pool:
+        results = pool.map(send_reminder, todos)
+        sent_ids = [todo['id'] for todo, ok in zip(todos, results) if ok]
 
-    conn.commit()
-    conn.close()
+    # One batched write after the sends, so no write lock is held across HTTP calls
+    if sent_ids:
+        placeholders = ','.join('?' * len(sent_ids))
+        cursor.execute(f'UPDATE todos SET reminder_sent = 1 WHERE id IN ({placeholders})', sent_ids)
 
 
 def record_daily_stats() -> None:
     """Record daily task stats into task_history for analytics."""
     try:
-        conn = get_db()
-        cursor = conn.cursor()
         today = datetime.now().date().isoformat()
-
-        cursor.execute(
-            'SELECT COUNT(*) as count FROM todos WHERE status = "completed" AND date(completed_at) = ?',
-            (today,)
-        )
-        completed = cursor.fetchone()['count']
-
-        cursor.execute(
-            'SELECT COUNT(*) as count FROM todos WHERE date(created_at) = ?',
-            (today,)
-        )
-        created = cursor.fetchone()['count']
-
-        cursor.execute('SELECT COUNT(*) as count FROM todos WHERE status = "pending"')
-        pending = cursor.fetchone()['count']
-
-        cursor.execute('''
-            INSERT INTO task_history (date, completed_count, created_count, pending_count)
-            VALUES (?, ?, ?, ?)
-            ON CONFLICT(date) DO UPDATE SET
-                completed_count = excluded.completed_count,
-                created_count = excluded.created_count,
-                pending_count = excluded.pending_count
-        ''', (today, completed, created, pending))
-
-        conn.commit()
-        conn.close()
+        get_conn().execute(SQL_RECORD_DAILY_STATS, {'today': today})
     except Exception:
         pass
 
@@ -81,55 +111,74 @@ def record_daily_stats() -> None:
 def send_daily_recap() -> None:
     # Record stats before sending recap
     record_daily_stats()
+    if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
+        return
 
     try:
-        conn = get_db()
+        conn = get_conn()
         cursor = conn.cursor()
 
-        cursor.execute('SELECT COUNT(*) as total FROM todos WHERE status = "pending"')
-        pending = cursor.fetchone()['total']
+        now = datetime.now()
+        cursor.execute(SQL_RECAP_SUMMARY, {'today': now.date().isoformat()})
+        summary = cursor.fetchone()
+        pending = summary['pending']
+        completed_today = summary['completed_today']
 
-        today = datetime.now().date().isoformat()
-        cursor.execute('SELECT COUNT(*) as count FROM todos WHERE status = "completed" AND date(completed_at) = ?', (today,))
-        completed_today = cursor.fetchone()['count']
-
-        cursor.execute('''
-            SELECT title, priority FROM todos
-            WHERE status = "pending"
-            ORDER BY CASE priority WHEN "urgent" THEN 1 WHEN "important" THEN 2 ELSE 3 END
-            LIMIT 5
-        ''')
+        cursor.execute(SQL_RECAP_PRIORITIES)
         priorities = cursor.fetchall()
 
-        cursor.execute('SELECT quote, quote_author FROM daily_content WHERE date = ?', (today,))
-        daily = cursor.fetchone()
-
-        conn.close()
-
-        message = f"""📊 <b>Récap du {datetime.now().strftime('%d/%m/%Y')}</b>
+        parts = [f"""📊 <b>Récap du {now.strftime('%d/%m/%Y')}</b>
 
 ✅ Tâches complétées aujourd'hui: <b>{completed_today}</b>
 📋 Tâches en attente: <b>{pending}</b>
 
-"""
+"""]
 
         if priorities:
-            message += "<b>Prochaines priorités:</b>\n"
-            for p in priorities:
-                emoji = {'urgent': '🔴', 'important': '🟠', 'normal': '🟡'}.get(p['priority'], '⚪')
-                message += f"{emoji} {p['title']}\n"
-            message += "\n"
+            parts.append("<b>Prochaines priorités:</b>\n")
+            parts.extend(f"{PRIORITY_EMOJI.get(p['priority'], '⚪')} {p['title']}\n" for p in priorities)
+            parts.append("\n")
 
-        if daily:
-            message += f"💭 <i>\"{daily['quote']}\"</i>\n— {daily['quote_author']}\n\n"
+        if summary['quote']:
+            parts.append(f"💭 <i>\"{summary['quote']}\"</i>\n— {summary['quote_author']}\n\n")
 
-        message += "<i>Bonne soirée Alexandre! 💪</i>"
+        parts.append("<i>Bonne soirée Alexandre! 💪</i>")
 
+        message = ''.join(parts)
         send_telegram_message(message)
     except Exception:
         pass
 
 
+# Completed recurring tasks (idx_todos_recurrence); rows without completed_at would
+# get their next date in the future, so they never spawn and are not fetched
+SQL_RECURRING_DONE = '''
+    SELECT title, description, category, priority, deadline,
+           recurrence_pattern, recurrence_end_date, completed_at
+    FROM todos
+    WHERE status = 'completed'
+    AND recurrence_pattern IS NOT NULL
+    AND recurrence_pattern != ''
+    AND completed_at IS NOT NULL
+'''
+
+SQL_RECURRING_PENDING = '''
+    SELECT title, recurrence_pattern FROM todos
+    WHERE status = 'pending'
+    AND recurrence_pattern IS NOT NULL
+'''
+
+
+@lru_cache(maxsize=1024)
+def _parse_iso(value: str) -> datetime:
+    # completed_at / recurrence_end_date strings repeat on every spawner pass
+    return datetime.fromisoformat(value)
+
+
+RECURRING_COPY_COLUMNS = (
+    'title', 'description', 'category', 'priority', 'deadline', 'recurrence_pattern', 'recurrence_end_date',
+)
+
 RECURRENCE_DELTAS = {
     'daily': timedelta(days=1),
     'weekdays': timedelta(days=1),  # special handling below
@@ -142,21 +191,22 @@ RECURRENCE_DELTAS = {
 def spawn_recurring_tasks() -> None:
     """Check completed recurring tasks and create the next occurrence."""
     try:
-        conn = get_db()
+        conn = get_conn()
         cursor = conn.cursor()
         now = datetime.now()
 
-        cursor.execute('''
-            SELECT * FROM todos
-            WHERE recurrence_pattern IS NOT NULL
-            AND status = 'completed'
-            AND recurrence_pattern != ''
-        ''')
+        cursor.execute(SQL_RECURRING_DONE)
         tasks = [dict(row) for row in cursor.fetchall()]
 
+        # Pending recurring copies, loaded once instead of one lookup per task
+        cursor.execute(SQL_RECURRING_PENDING)
+        pending_copies = {(row['title'], row['recurrence_pattern']) for row in cursor.fetchall()}
+
+        copies = []
+
         for task in tasks:
             pattern = task['recurrence_pattern']
-            completed_at = datetime.fromisoformat(task['completed_at']) if task.get('completed_at') else now
+            completed_at = _parse_iso(task['completed_at']) if task.get('completed_at') else now
 
             delta = RECURRENCE_DELTAS.get(pattern)
             if not delta:
@@ -166,12 +216,13 @@ def spawn_recurring_tasks() -> None:
 
             # Weekdays: skip Saturday/Sunday
             if pattern == 'weekdays':
-                while next_date.weekday() >= 5:  # 5=Sat, 6=Sun
-                    next_date += timedelta(days=1)
+                weekday = next_date.weekday()
+                if weekday >= 5:  # 5=Sat, 6=Sun: jump to Monday
+                    next_date += timedelta(days=7 - weekday)
 
             # Check recurrence_end_date
             if task.get('recurrence_end_date'):
-                end_date = datetime.fromisoformat(task['recurrence_end_date'])
+                end_date = _parse_iso(task['recurrence_end_date'])
                 if next_date > end_date:
                     continue
 
@@ -179,19 +230,13 @@ def spawn_recurring_tasks() -> None:
             if next_date > now:
                 continue
 
-            # Check if a pending copy already exists (avoid duplicates)
-            cursor.execute('''
-                SELECT COUNT(*) as count FROM todos
-                WHERE title = ? AND status = 'pending' AND recurrence_pattern = ?
-            ''', (task['title'], pattern))
-            if cursor.fetchone()['count'] > 0:
+            # Skip if a pending copy already exists (avoid duplicates)
+            if (task['title'], pattern) in pending_copies:
                 continue
+            pending_copies.add((task['title'], pattern))
 
             # Create fresh copy
-            cursor.execute('''
-                INSERT INTO todos (title, description, category, priority, deadline, recurrence_pattern, recurrence_end_date)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
+            copies.append((
                 task['title'],
                 task.get('description'),
                 task.get('category', 'general'),
@@ -201,7 +246,7 @@ def spawn_recurring_tasks() -> None:
                 task.get('recurrence_end_date')
             ))
 
-        conn.commit()
-        conn.close()
+        if copies:
+            bulk_insert(conn, 'todos', RECURRING_COPY_COLUMNS, copies)
     except Exception:
         pass
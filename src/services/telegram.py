@@ -1,7 +1,15 @@
+import queue
+import threading
+
 import requests
+from requests.adapters import HTTPAdapter
 
 from src.config import TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID
 
+# Keep-alive pool to api.telegram.org (saves a TCP + TLS handshake per message)
+_TG_SESSION = requests.Session()
+_TG_SESSION.mount('https://', HTTPAdapter(pool_connections=2, pool_maxsize=8, max_retries=1))
+
 
 def send_telegram_message(message: str) -> bool:
     if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
@@ -15,7 +23,39 @@ def send_telegram_message(message: str) -> bool:
     }
 
     try:
-        response = requests.post(url, json=payload, timeout=10)
+        response = _TG_SESSION.post(url, json=payload, timeout=10)
         return response.status_code == 200
     except Exception:
         return False
+
+
+# Fire-and-forget sends: request handlers enqueue, a daemon thread does the HTTP call
+_tg_queue: "queue.Queue[str]" = queue.Queue()
+_tg_worker = None
+_tg_worker_lock = threading.Lock()
+
+
+def _tg_worker_loop() -> None:
+    while True:
+        message = _tg_queue.get()
+        try:
+            send_telegram_message(message)
+        finally:
+            _tg_queue.task_done()
+
+
+def queue_telegram_message(message: str) -> bool:
+    """Send a message in the background; returns False only if Telegram is not configured."""
+    global _tg_worker
+    if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
+        return False
+
+    # Started lazily so each (forked) worker process gets its own thread
+    if _tg_worker is None or not _tg_worker.is_alive():
+        with _tg_worker_lock:
+            if _tg_worker is None or not _tg_worker.is_alive():
+                _tg_worker = threading.Thread(target=_tg_worker_loop, name='telegram-sender', daemon=True)
+                _tg_worker.start()
+
+    _tg_queue.put(message)
+    return True
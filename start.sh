@@ -6,7 +6,7 @@ SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
 cd "$SCRIPT_DIR" || exit 1
 
 # Launch gunicorn (dashboard) immediately
-python3 -m gunicorn -w 2 -b 0.0.0.0:5001 src.app:app &
+python3 -m gunicorn -c gunicorn.conf.py src.app:app &
 GUNICORN_PID=$!
 
 # Wait for old Telegram polling session to expire before starting bot